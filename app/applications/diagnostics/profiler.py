@@ -0,0 +1,110 @@
+"""
+Stack sampling profiler for a live worker.
+
+A background thread reads the stacks of the sampled threads with
+sys._current_frames at a fixed interval and counts identical stacks.
+Nothing is traced between samples, so the cost is bounded by the interval
+and the stack depth, and the result is written in the collapsed format
+read by flamegraph.pl, speedscope and similar tools:
+
+    main (app/main.py:1);run (asyncio/runners.py:86);... 42
+"""
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Optional
+
+from app.core.config import settings
+
+MAX_DEPTH = 128
+_STDLIB = sysconfig.get_paths()["stdlib"] + os.sep
+
+
+def _short_path(filename: str) -> str:
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    if filename.startswith(settings.BASE_DIR):
+        return os.path.relpath(filename, settings.BASE_DIR)
+    if filename.startswith(_STDLIB):
+        return filename[len(_STDLIB):]
+    return filename
+
+
+def _label(code: CodeType, labels: dict[CodeType, str]) -> str:
+    label = labels.get(code)
+    if label is None:
+        # ";" separates frames in the collapsed format
+        label = labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})" \
+            .replace(";", ":")
+    return label
+
+
+def collapse(frame: Optional[FrameType], labels: dict[CodeType, str], max_depth: int = MAX_DEPTH) -> str:
+    """
+    Root first ;-joined stack of frame, the innermost max_depth frames are kept.
+    labels caches the frame labels per code object.
+    """
+    stack = []
+    while frame is not None and len(stack) < max_depth:
+        stack.append(_label(frame.f_code, labels))
+        frame = frame.f_back
+    if frame is not None:
+        stack.append("...")
+    stack.reverse()
+    return ";".join(stack)
+
+
+class StackSampler:
+    """
+    Samples thread_ids (all threads but the sampler when None) every interval seconds for a duration.
+    run blocks, call it from a thread so the sampled event loop keeps going.
+    """
+
+    def __init__(self,
+                 duration: float,
+                 interval: float = 0.01,
+                 thread_ids: Optional[set[int]] = None,
+                 max_depth: int = MAX_DEPTH):
+        self.duration = duration
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.max_depth = max_depth
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+
+    def run(self) -> Counter[str]:
+        own = threading.get_ident()
+        names = {}
+        if self.thread_ids is None:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+        labels: dict[CodeType, str] = {}
+        deadline = time.monotonic() + self.duration
+        next_at = time.monotonic()
+        while next_at < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or self.thread_ids is not None and thread_id not in self.thread_ids:
+                    continue
+                stack = collapse(frame, labels, self.max_depth)
+                if self.thread_ids is None:
+                    # keep threads apart in the flamegraph
+                    stack = f"{names.get(thread_id, thread_id)};{stack}"
+                self.stacks[stack] += 1
+            self.samples += 1
+
+            next_at += self.interval
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # fell behind, skip the missed ticks instead of sampling in a burst
+                next_at = time.monotonic()
+        return self.stacks
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Union
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from app.applications.users.models import User
+from app.core.auth.schemas import TokenUser
+from app.core.auth.deps import get_current_active_superuser
+from app.core.config import settings
+
+from .profiler import StackSampler
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=['diagnostics'])
+
+# one profile per worker at a time, concurrent samplers would skew each other
+_profiling = asyncio.Lock()
+
+
+@router.get("/profile", response_class=Response, status_code=200)
+async def profile(seconds: float = Query(default=10, gt=0, le=settings.PROFILER_MAX_SECONDS),
+                  interval: float = Query(default=0.01, ge=settings.PROFILER_MIN_INTERVAL, le=1),
+                  all_threads: bool = False,
+                  current_user: Union[User, TokenUser] = Depends(get_current_active_superuser)):
+    """
+    Sample the stacks of the worker answering this request and return them
+    as a collapsed stack file, ready for flamegraph.pl or speedscope.
+    Only the event loop thread is sampled unless all_threads is set.
+    """
+    if _profiling.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running on this worker")
+
+    async with _profiling:
+        # this handler runs on the event loop thread
+        thread_ids = None if all_threads else {threading.get_ident()}
+        sampler = StackSampler(seconds, interval, thread_ids)
+        logger.info(f"profiling worker {os.getpid()} for {seconds}s every {interval}s, "
+                    f"requested by {current_user.id}")
+        await asyncio.to_thread(sampler.run)
+
+    filename = f"profile-{os.getpid()}-{int(time.time())}.collapsed"
+    return Response(
+        content=sampler.collapsed(),
+        media_type="text/plain",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Worker-Pid": str(os.getpid()),
+            "X-Profile-Samples": str(sampler.samples),
+        },
+    )
@@ -2,7 +2,9 @@ from typing import Optional
 
 import logging
 
+from app.core.auth.utils.permission import invalidate_claims
 from app.core.base.base_models import BaseCreatedUpdatedAtModel, UUIDDBModel, BaseDBModel
+from app.core.base.m2m import ThroughTable
 
 from tortoise import fields
 from tortoise.exceptions import DoesNotExist
@@ -38,3 +40,12 @@ class Group(BaseDBModel, BaseCreatedUpdatedAtModel, UUIDDBModel):
 
     def __str__(self):
         return f"<Group:{self.id} {self.name}>"
+
+
+async def _members_changed(group_id: int, user_ids: list) -> None:
+    # the cached users carry their prefetched groups, see load_user
+    await User.delete_caches(user_ids)
+    await invalidate_claims(user_ids)
+
+
+group_users = ThroughTable(Group, "users", on_change=_members_changed)
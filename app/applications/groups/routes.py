@@ -1,6 +1,6 @@
 from tortoise.functions import Count
-from .schemas import AddUser, GroupWithUserCount, GroupDetail
-from .models import Group
+from .schemas import AddUser, GroupOut, GroupWithUserCount, GroupDetail, GroupOutList, MembershipChange
+from .models import Group, group_users
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Optional, TypeVar
 
@@ -8,6 +8,10 @@ from tortoise import models, fields, expressions
 from tortoise.contrib.pydantic import pydantic_model_creator, pydantic_queryset_creator
 
 from app.applications.users.models import User
+from app.applications.users.schemas import BaseUserOut, BaseUserOutList
+from app.core.base.pagination import Keyset, paginate
+from app.core.base.responses import FastJSONResponse
+from app.core.base.schemas import ResponseData
 
 import logging
 logger = logging.getLogger(__name__)
@@ -15,18 +19,19 @@ logger = logging.getLogger(__name__)
 router = APIRouter(tags=['groups'])
 
 
-@router.get("/", response_model=list[GroupWithUserCount])
+@router.get("/", response_model=ResponseData[GroupOutList])
 async def groups(keywords: Optional[str] = None,
                  page: Optional[int] = Query(title="page", ge=1, default=1),
-                 page_size: Optional[int] = Query(title="page_size", le=20, default=10)):
+                 page_size: Optional[int] = Query(title="page_size", le=20, default=10),
+                 cursor: Optional[str] = None):
     if keywords:
         query = Group.filter(name__icontains=keywords)
     else:
         query = Group.all()
 
-    query = query.offset((page-1) * page_size).limit(page_size)
-    query = query.annotate(user_count=Count('users')).all()
-    return await GroupWithUserCount.from_queryset(query)
+    data = await paginate(query.annotate(user_count=Count('users')), Keyset(Group), page_size,
+                          cursor=cursor, page=page, total_key=f"groups:{keywords or ''}")
+    return FastJSONResponse(ResponseData[GroupOutList](data=data))
 
 
 @router.post("/")
@@ -36,29 +41,66 @@ async def create_group(name: str, description: Optional[str] = None):
     return g
 
 
-@router.get("/{group_id}")
-async def group(group_id: int):
-    g = await Group.get_or_none(id=group_id).prefetch_related('users')
-    if g is None:
-        return HTTPException(status_code=404, detail="Item not found")
+# member rows are read as values() dicts, no User instances are built
+MEMBER_FIELDS = tuple(BaseUserOut.model_fields)
 
-    # await g.users
-    # # PydanticGroup = pydantic_model_creator(Group)
-    # print(g.users)
 
-    return await GroupDetail.from_tortoise_orm(g)
+async def _group_members(group_id: int, page_size: int, cursor: Optional[str] = None, page: int = 1) -> dict:
+    members = await paginate(User.filter(groups__id=group_id), Keyset(User), page_size,
+                             cursor=cursor, page=page, fields=MEMBER_FIELDS)
+    members["total"] = await group_users.count(group_id)
+    return members
 
 
-@router.put("/{group_id}/user")
-async def add_user_to_group(group_id: int, schema: AddUser):
-    g = await Group.get_or_none(id=group_id).prefetch_related("users")
+@router.get("/{group_id}", response_model=ResponseData[GroupDetail])
+async def group(group_id: int,
+                page_size: Optional[int] = Query(title="page_size", le=20, default=10)):
+    g = await Group.get_or_none(id=group_id)
     if g is None:
-        return HTTPException(status_code=404, detail="Item not found")
-
-    print("-----------")
-    # print(await g.users)
-    users = await User.filter(id__in=schema.user_ids)
-    if len(users) > 0:
-        await g.users.add(*users)
-        print(g)
-    return users
+        raise HTTPException(status_code=404, detail="Item not found")
+
+    members = await _group_members(group_id, page_size)
+    detail = GroupOut.model_validate(g).model_dump()
+    return {"data": {**detail, "user_count": members["total"], "users": members}}
+
+
+@router.get("/{group_id}/users", response_model=ResponseData[BaseUserOutList])
+async def group_members(group_id: int,
+                        page: Optional[int] = Query(title="page", ge=1, default=1),
+                        page_size: Optional[int] = Query(title="page_size", le=20, default=10),
+                        cursor: Optional[str] = None):
+    if not await Group.exists(id=group_id):
+        raise HTTPException(status_code=404, detail="Item not found")
+    members = await _group_members(group_id, page_size, cursor=cursor, page=page)
+    return FastJSONResponse(ResponseData[BaseUserOutList](data=members))
+
+
+async def _get_group_id(group_id: int) -> int:
+    if not await Group.exists(id=group_id):
+        raise HTTPException(status_code=404, detail="Item not found")
+    return group_id
+
+
+@router.put("/{group_id}/user", response_model=ResponseData[MembershipChange])
+@router.post("/{group_id}/users", response_model=ResponseData[MembershipChange])
+async def add_user_to_group(schema: AddUser, group_id: int = Depends(_get_group_id)):
+    """
+    Add users to the group, existing members and unknown ids are skipped.
+    """
+    added = await group_users.add(group_id, schema.user_ids)
+    return {"data": {"added": added, "total": await group_users.count(group_id)}}
+
+
+@router.delete("/{group_id}/users", response_model=ResponseData[MembershipChange])
+async def remove_users_from_group(schema: AddUser, group_id: int = Depends(_get_group_id)):
+    removed = await group_users.remove(group_id, schema.user_ids)
+    return {"data": {"removed": removed, "total": await group_users.count(group_id)}}
+
+
+@router.put("/{group_id}/users", response_model=ResponseData[MembershipChange])
+async def replace_group_users(schema: AddUser, group_id: int = Depends(_get_group_id)):
+    """
+    Make user_ids the exact member list of the group.
+    """
+    added, removed = await group_users.replace(group_id, schema.user_ids)
+    return {"data": {"added": added, "removed": removed, "total": await group_users.count(group_id)}}
@@ -1,7 +1,8 @@
 from .models import Group
-from app.applications.users.schemas import BaseUserOut
+from app.applications.users.schemas import BaseUserOut, BaseUserOutList
 from tortoise.contrib.pydantic import pydantic_model_creator
 from pydantic import BaseModel
+from app.core.base.schemas import PageData
 import logging
 logger = logging.getLogger(__name__)
 
@@ -10,9 +11,24 @@ class AddUser(BaseModel):
     user_ids: list[int]
 
 
-class GroupWithUserCount(pydantic_model_creator(Group, name="Group", exclude=('users',))):
+class MembershipChange(BaseModel):
+    added: int = 0
+    removed: int = 0
+    total: int
+
+
+GroupOut = pydantic_model_creator(Group, name="Group", exclude=('users',))
+
+
+class GroupWithUserCount(GroupOut):
     user_count: int
 
 
-class GroupDetail(pydantic_model_creator(Group, name="Group", exclude=('users',))):
-    users: list[BaseUserOut]
+class GroupOutList(PageData[GroupWithUserCount]):
+    pass
+
+
+class GroupDetail(GroupOut):
+    user_count: int
+    # first page of members, the next pages come from /groups/{id}/users
+    users: BaseUserOutList
@@ -1,16 +1,27 @@
 
-from .schemas import MenuType, MenuOut
+from .default_routes import DEFAULT_ROUTES
+from .schemas import MenuType, MenuOut, Route, RouteMeta
+from .utils import build_tree, filter_with_ancestors
 from app.core.base.base_models import BaseCreatedUpdatedAtModel, UUIDDBModel, BaseDBModel, CacheModelMixin
+from app.core.base.m2m import ThroughTable
+from app.core.cache import VersionedCache
 from app.applications.users.schemas import BaseUserCreate
 from tortoise.exceptions import DoesNotExist
 from tortoise import fields
-from typing import Optional
+from itertools import chain
+from typing import Iterable, Optional
 import logging
 
 from app.applications.users.models import User
 
 logger = logging.getLogger(__name__)
 
+MENU_OUT_FIELDS = tuple(f for f in MenuOut.model_fields if f != "children")
+ROUTE_FIELDS = ("id", "parent_id", "name", "type", "path", "icon", "redirect", "component", "route_name", "external_link")
+
+# serialized menu/catalog trees, invalidated on every menu change
+menu_cache = VersionedCache("menu")
+
 
 class Menu(BaseDBModel, BaseCreatedUpdatedAtModel, UUIDDBModel):
     name = fields.CharField(max_length=128, unique=True)
@@ -25,6 +36,8 @@ class Menu(BaseDBModel, BaseCreatedUpdatedAtModel, UUIDDBModel):
     redirect = fields.CharField(max_length=128, null=True)
 
     component = fields.CharField(max_length=128, null=True)
+    # vue-router route name of a page menu, matched by keep-alive
+    route_name = fields.CharField(max_length=128, null=True)
 
     # for button permission
     permission_key = fields.CharField(max_length=128, null=True)
@@ -45,35 +58,51 @@ class Menu(BaseDBModel, BaseCreatedUpdatedAtModel, UUIDDBModel):
 
     @classmethod
     async def full_hierarchy_menu(cls, parent=None, query: Optional[str] = None) -> list[MenuOut]:
-        result = []
-        query_set = cls.filter(parent=parent, is_deleted=False)
+        rows = await cls.filter(is_deleted=False).order_by("sort", "id").values(*MENU_OUT_FIELDS)
         if query:
-            query_set = query_set.filter(name__icontains=query)
-        root_menus = await query_set.order_by("sort", "id").all()
-
-        for root in root_menus:
-            d = {}
-            print(root._meta.db_fields)
-            for field in root._meta.db_fields:
-                d[field] = getattr(root, field)
-            d["parent_id"] = parent.id if parent else None
-            d["children"] = await cls.full_hierarchy_menu(root, query)
-            result.append(MenuOut(**d))
+            keywords = query.casefold()
+            rows = filter_with_ancestors(
+                rows, lambda row: keywords in row["name"].casefold())
 
-        return result
+        tree = build_tree(rows, root_id=parent.id if parent else None)
+        return [MenuOut(**node) for node in tree]
 
     @classmethod
     async def full_hierarchy_catalog(cls, parent=None):
-        result = []
-        root_menus = await cls.filter(parent=parent, type__in=[MenuType.CATALOG, MenuType.MENU], active=True).order_by("sort", "id").all()
-        for root in root_menus:
-            result.append({
-                "value": root.id,
-                "label": root.name,
-                "children": await cls.full_hierarchy_catalog(root)
-            })
+        rows = await cls.filter(type__in=[MenuType.CATALOG, MenuType.MENU], active=True) \
+            .order_by("sort", "id").values(value="id", label="name", parent_id="parent_id")
+        tree = build_tree(rows, root_id=parent.id if parent else None, key="value")
+        for row in rows:
+            del row["parent_id"]
+        return tree
 
-        return result
+    @classmethod
+    async def route_tree(cls, role_keys: Optional[Iterable[str]] = None) -> list[Route]:
+        """
+        Sidebar routes from the active CATALOG/MENU rows, in one query.
+        With role_keys only the menus granted to one of them are kept, plus
+        their ancestors, None means all menus (superusers).
+        Falls back to DEFAULT_ROUTES while the menu table is empty.
+        """
+        rows = await cls.filter(type__in=[MenuType.CATALOG, MenuType.MENU], active=True, is_deleted=False) \
+            .order_by("sort", "id").values(*ROUTE_FIELDS, role="roles__key", role_active="roles__active")
+        if not rows:
+            return [Route(**route) for route in DEFAULT_ROUTES]
+
+        # one row per (menu, role) pair, fold the granting roles into the menu
+        menus: dict[int, dict] = {}
+        for row in rows:
+            role, role_active = row.pop("role"), row.pop("role_active")
+            menu = menus.setdefault(row["id"], {**row, "roles": []})
+            if role is not None and role_active:
+                menu["roles"].append(role)
+
+        menus = list(menus.values())
+        if role_keys is not None:
+            role_keys = set(role_keys)
+            menus = filter_with_ancestors(menus, lambda menu: not role_keys.isdisjoint(menu["roles"]))
+
+        return [_route(node, top=True) for node in build_tree(menus)]
 
     class Config:
         arbitrary_types_allowed = True
@@ -82,6 +111,28 @@ class Menu(BaseDBModel, BaseCreatedUpdatedAtModel, UUIDDBModel):
         return f"{self.name}"
 
 
+def _route(menu: dict, top: bool = False) -> Route:
+    path = menu["external_link"] or menu["path"] or ""
+    component = menu["component"]
+    if not component and menu["type"] == MenuType.CATALOG and top:
+        component = "Layout"
+    children = [_route(child) for child in menu["children"]]
+    # keys of the roles granted the menu or one of its children, a parent must let
+    # through every role of its children. Menus no role grants keep the default.
+    roles = list(dict.fromkeys(chain(menu["roles"], *(child.meta.roles for child in children))))
+    meta = RouteMeta(title=menu["name"], icon=menu["icon"])
+    if roles:
+        meta.roles = roles
+    return Route(
+        path=path,
+        component=component,
+        redirect=menu["redirect"],
+        name=menu["route_name"],
+        meta=meta,
+        children=children,
+    )
+
+
 class Role(BaseDBModel, BaseCreatedUpdatedAtModel, UUIDDBModel):
     name = fields.CharField(max_length=128, unique=True)
     key = fields.CharField(max_length=128, unique=True)
@@ -97,3 +148,6 @@ class Role(BaseDBModel, BaseCreatedUpdatedAtModel, UUIDDBModel):
 
     def __str__(self):
         return f"<Role:{self.id} {self.name}>"
+
+
+role_menus = ThroughTable(Role, "permissions")
@@ -2,6 +2,8 @@ from enum import Enum
 from typing import Optional, TypeVar, List
 from pydantic import BaseModel, EmailStr, UUID4, validator
 
+from app.core.base.schemas import PageData
+
 import logging
 logger = logging.getLogger(__name__)
 
@@ -46,6 +48,7 @@ class MenuOut(BaseModel):
     icon: Optional[str] = None
     redirect: Optional[str] = None
     component: Optional[str] = None
+    route_name: Optional[str] = None
     permission_key: Optional[str] = None
     external_link: Optional[str] = None
     active: bool = True
@@ -63,6 +66,7 @@ class MenuIn(BaseModel):
     icon: Optional[str] = None
     redirect: Optional[str] = None
     component: Optional[str] = None
+    route_name: Optional[str] = None
     permission_key: Optional[str] = None
     external_link: Optional[str] = None
     active: bool = True
@@ -80,6 +84,7 @@ class MenuUpdate(BaseModel):
     icon: Optional[str] = None
     redirect: Optional[str] = None
     component: Optional[str] = None
+    route_name: Optional[str] = None
     permission_key: Optional[str] = None
     external_link: Optional[str] = None
     active: Optional[bool] = None
@@ -105,9 +110,7 @@ class RoleOut(BaseModel):
         from_attributes = True
 
 
-class RoleOutList(BaseModel):
-    total: int
-    items: List[RoleOut]
+class RoleOutList(PageData[RoleOut]):
 
     class Config:
         from_attributes = True
@@ -0,0 +1,43 @@
+from typing import Callable, Iterable, Optional
+
+
+def build_tree(rows: Iterable[dict],
+               root_id: Optional[int] = None,
+               key: str = "id",
+               parent_key: str = "parent_id",
+               children_key: str = "children") -> list[dict]:
+    """
+    Assemble flat rows into a nested tree in O(n).
+    Rows keep their input order inside each level, so order the query
+    the way the tree should be sorted.
+    """
+    rows = list(rows)
+    index: dict[Optional[int], list[dict]] = {}
+    for row in rows:
+        index.setdefault(row[parent_key], []).append(row)
+
+    for row in rows:
+        row[children_key] = index.get(row[key], [])
+
+    return index.get(root_id, [])
+
+
+def filter_with_ancestors(rows: list[dict],
+                          predicate: Callable[[dict], bool],
+                          key: str = "id",
+                          parent_key: str = "parent_id") -> list[dict]:
+    """
+    Keep the rows matching predicate plus all of their ancestors,
+    so the matches stay reachable from the root of the tree.
+    """
+    by_id = {row[key]: row for row in rows}
+    keep = set()
+    for row in rows:
+        if not predicate(row):
+            continue
+        node = row
+        while node is not None and node[key] not in keep:
+            keep.add(node[key])
+            node = by_id.get(node[parent_key])
+
+    return [row for row in rows if row[key] in keep]
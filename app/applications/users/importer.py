@@ -0,0 +1,198 @@
+"""
+Bulk user import, run by the import_users celery task.
+
+Rows are streamed from a spooled CSV or NDJSON upload and handled in chunks of
+IMPORT_BATCH_SIZE: validated with BaseUserCreate, checked for duplicates,
+hashed on a thread pool and inserted with bulk_create in one transaction per chunk.
+"""
+import asyncio
+import csv
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Iterator, Optional, Union
+
+import redis
+from pydantic import ValidationError
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
+
+from app.applications.users.models import User, UserSearchTerm, SEARCH_FIELDS, UNKNOWN_IDENTIFIER_KEY
+from app.applications.users.schemas import BaseUserCreate
+from app.core.auth.utils.contrib import send_account_confirm_emails
+from app.core.auth.utils.password import get_password_hash
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+# errors kept in the task result, the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+def read_rows(f: BinaryIO, fmt: str) -> Iterator[tuple[int, Union[dict, ValueError]]]:
+    """
+    (row number, row) pairs of the upload, a row that can't be parsed is yielded as the error.
+    """
+    lines = (line.decode("utf-8-sig") for line in f)
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for row_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield row_no, e
+            continue
+        yield row_no, row if isinstance(row, dict) else ValueError("row is not an object")
+
+
+class UserImport:
+
+    def __init__(self,
+                 path: str,
+                 fmt: str,
+                 notify: bool = False,
+                 progress: Optional[Callable[[dict], None]] = None,
+                 batch_size: int = settings.IMPORT_BATCH_SIZE,
+                 hash_workers: int = settings.IMPORT_HASH_WORKERS):
+        self.path = path
+        self.fmt = fmt
+        self.notify = notify
+        self.progress = progress
+        self.batch_size = batch_size
+        self.hash_workers = hash_workers
+        self.processed = 0
+        self.created = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+        self.percent = 0
+
+    def error(self, row_no: int, msg: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_no, "msg": msg})
+
+    def report(self) -> dict:
+        return {
+            "percent": self.percent,
+            "processed": self.processed,
+            "created": self.created,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+    async def run(self) -> dict:
+        size = os.path.getsize(self.path) or 1
+        with open(self.path, "rb") as f, ThreadPoolExecutor(self.hash_workers) as executor:
+            chunk = []
+            for row_no, row in read_rows(f, self.fmt):
+                chunk.append((row_no, row))
+                if len(chunk) >= self.batch_size:
+                    await self.import_chunk(chunk, executor)
+                    chunk = []
+                    self.percent = f.tell() * 100 // size
+                    if self.progress:
+                        self.progress(self.report())
+            if chunk:
+                await self.import_chunk(chunk, executor)
+        self.percent = 100
+        return self.report()
+
+    def validate(self, chunk: list[tuple[int, Union[dict, ValueError]]]) -> list[tuple[int, BaseUserCreate]]:
+        valid = []
+        for row_no, row in chunk:
+            if isinstance(row, ValueError):
+                self.error(row_no, f"invalid row: {row}")
+                continue
+            try:
+                user = BaseUserCreate.model_validate({k: v for k, v in row.items() if v not in ("", None)})
+            except ValidationError as e:
+                err = e.errors(include_url=False)[0]
+                self.error(row_no, f"{'.'.join(map(str, err['loc']))}: {err['msg']}")
+                continue
+            if not user.username:
+                self.error(row_no, "username: Field required")
+                continue
+            valid.append((row_no, user))
+        return valid
+
+    async def import_chunk(self, chunk: list[tuple[int, Union[dict, ValueError]]], executor: ThreadPoolExecutor):
+        self.processed += len(chunk)
+        valid = self.validate(chunk)
+        if not valid:
+            return
+
+        identifiers = [i for _, user in valid for i in (user.email, user.username)]
+        taken = set()
+        for email, username in await User.filter(Q(email__in=identifiers) | Q(username__in=identifiers)) \
+                .values_list("email", "username"):
+            taken.update((email, username))
+
+        accepted = []
+        for row_no, user in valid:
+            if user.email in taken or user.username in taken:
+                self.error(row_no, "email or username already exists")
+                continue
+            taken.update((user.email, user.username))
+            accepted.append((row_no, user))
+        if not accepted:
+            return
+
+        loop = asyncio.get_running_loop()
+        hashes = await asyncio.gather(
+            *(loop.run_in_executor(executor, get_password_hash, user.password) for _, user in accepted))
+        users = [User(**user.model_dump(exclude_unset=True, exclude={"password"}), password_hash=password_hash)
+                 for (_, user), password_hash in zip(accepted, hashes)]
+
+        emails = [user.email for user in users]
+        try:
+            async with in_transaction():
+                await User.bulk_create(users)
+                created = await User.filter(email__in=emails).only("id", *SEARCH_FIELDS)
+                await UserSearchTerm.bulk_create(User.build_search_terms(created))
+        except IntegrityError as e:
+            # a concurrent insert took one of the names, the whole chunk is rolled back
+            for row_no, _ in accepted:
+                self.error(row_no, f"conflict while inserting: {e}")
+            return
+        self.created += len(created)
+
+        forget_unknown_identifiers(identifiers)
+        if self.notify:
+            try:
+                send_account_confirm_emails((user.id, user.email, user.username) for user in created)
+            except Exception as e:
+                # the users are committed, a mail problem must not fail the rest of the import
+                logger.warning(f"queue confirm emails for {len(created)} imported users failed: {e}")
+
+
+def forget_unknown_identifiers(identifiers: list[str]):
+    try:
+        with redis.Redis.from_url(settings.REDIS_URL) as client:
+            client.delete(*(UNKNOWN_IDENTIFIER_KEY.format(i) for i in identifiers))
+    except redis.RedisError as e:
+        logger.warning(f"unknown identifier cache unavailable: {e}")
+
+
+async def run_import(path: str, fmt: str, notify: bool = False,
+                     progress: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    Import a spooled upload in a worker process, then remove it.
+    """
+    from tortoise import Tortoise
+    from app.core.init_app import TORTOISE_ORM
+
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        return await UserImport(path, fmt, notify=notify, progress=progress).run()
+    finally:
+        await Tortoise.close_connections()
+        os.remove(path)
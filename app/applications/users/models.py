@@ -1,12 +1,26 @@
-from typing import Optional
+import logging
+import re
+from typing import Iterable, Optional
 
+from redis.exceptions import RedisError
 from tortoise import fields
-from tortoise.exceptions import DoesNotExist
+from tortoise.models import Model
+from tortoise.expressions import Q, Subquery
+from tortoise.queryset import QuerySet
+from tortoise.transactions import in_transaction
 
 from app.applications.users.schemas import BaseUserCreate
 from app.core.base.base_models import BaseCreatedUpdatedAtModel, UUIDDBModel, BaseDBModel
-from app.core.auth.utils import password
-from app.core.cache import model_cache
+from app.core.auth.utils import password, permission
+from app.core.cache import cache, tiered_cache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_IDENTIFIER_KEY = "user:unknown:{}"
+
+SEARCH_FIELDS = ("username", "email", "nickname", "first_name", "last_name")
+SEARCH_WORD_SEPARATOR = re.compile(r"[\s@._+-]+")
 
 
 class User(BaseDBModel, BaseCreatedUpdatedAtModel, UUIDDBModel):
@@ -30,43 +44,151 @@ class User(BaseDBModel, BaseCreatedUpdatedAtModel, UUIDDBModel):
             return f"{self.first_name or ''} {self.last_name or ''}".strip()
         return self.username
 
-    @property
-    def permissions(self) -> set[str]:
-        _permissions = []
-        if self.groups:
-            _permissions = [p for g in self.groups for p in g.permissions]
-
-        return set(_permissions)
+    async def get_permissions(self) -> frozenset[str]:
+        return await permission.get_user_permissions(self.id)
 
     @classmethod
     async def get_by_email(cls, email: str) -> Optional["User"]:
-        try:
-            query = cls.get_or_none(email=email)
-            user = await query
-            return user
-        except DoesNotExist:
-            return None
+        return await cls.get_or_none(email=email)
 
     @classmethod
     async def get_by_username(cls, username: str) -> Optional["User"]:
-        try:
-            query = cls.get(username=username)
-            user = await query
-            return user
-        except DoesNotExist:
+        return await cls.get_or_none(username=username)
+
+    @classmethod
+    async def get_by_identifiers(cls, identifiers: Iterable[str], only: Iterable[str] = ()) -> Optional["User"]:
+        """
+        First user whose email or username matches one of the identifiers, in one query.
+        Identifiers that matched nobody are remembered for AUTH_UNKNOWN_IDENTIFIER_TTL seconds,
+        so repeated attempts with unknown names don't reach the database.
+        """
+        identifiers = list(dict.fromkeys(i for i in identifiers if i))
+        if not identifiers:
             return None
+        keys = [UNKNOWN_IDENTIFIER_KEY.format(i) for i in identifiers]
+        try:
+            if await cache.exists(*keys) == len(keys):
+                return None
+        except RedisError as e:
+            logger.warning(f"unknown identifier cache unavailable: {e}")
+
+        query = cls.filter(Q(email__in=identifiers) | Q(username__in=identifiers))
+        if only:
+            query = query.only(*{"id", "email", "username", *only})
+        users = await query
+        for identifier in identifiers:
+            for user in users:
+                if identifier in (user.email, user.username):
+                    return user
+
+        try:
+            async with cache.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.set(key, 1, ex=settings.AUTH_UNKNOWN_IDENTIFIER_TTL)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"unknown identifier cache unavailable: {e}")
+        return None
+
+    @classmethod
+    def _init_from_db(cls, **kwargs) -> "User":
+        user = super()._init_from_db(**kwargs)
+        user._search_values = user.get_search_values()
+        return user
+
+    def get_search_values(self) -> tuple:
+        return tuple(getattr(self, field, None) for field in SEARCH_FIELDS)
+
+    def get_search_terms(self) -> set[str]:
+        """
+        Casefolded search fields, whole and split into words,
+        so "john.doe@example.com" is found by "john.doe", "doe" or "example".
+        """
+        terms = set()
+        for field in SEARCH_FIELDS:
+            value = getattr(self, field, None)
+            if value:
+                value = value.casefold()
+                terms.add(value)
+                terms.update(w for w in SEARCH_WORD_SEPARATOR.split(value) if w)
+        return terms
+
+    @staticmethod
+    def build_search_terms(users: Iterable["User"]) -> list["UserSearchTerm"]:
+        return [UserSearchTerm(term=term, user_id=user.id) for user in users for term in user.get_search_terms()]
+
+    async def update_search_terms(self, using_db=None) -> None:
+        await UserSearchTerm.filter(user_id=self.id).using_db(using_db).delete()
+        await UserSearchTerm.bulk_create(self.build_search_terms([self]), using_db=using_db)
+
+    @classmethod
+    def search(cls, keywords: str) -> QuerySet["User"]:
+        """
+        Users with a search term starting with every word of keywords.
+        The prefix is matched as a range on the term index instead of a LIKE.
+        """
+        query = cls.all()
+        for word in keywords.casefold().split():
+            terms = UserSearchTerm.filter(term__gte=word, term__lt=word + SEARCH_TERM_MAX_CHAR)
+            query = query.filter(id__in=Subquery(terms.values("user_id")))
+        return query
+
+    @classmethod
+    async def rebuild_search_terms(cls, batch_size: int = 1000) -> None:
+        """
+        Fill the search index for users created before it existed or bulk inserted.
+        """
+        last_id = 0
+        while users := await cls.filter(id__gt=last_id).order_by("id").limit(batch_size).only("id", *SEARCH_FIELDS):
+            user_ids = [user.id for user in users]
+            await UserSearchTerm.filter(user_id__in=user_ids).delete()
+            await UserSearchTerm.bulk_create(cls.build_search_terms(users))
+            last_id = user_ids[-1]
+
+    async def save(self, using_db=None, update_fields: Optional[Iterable[str]] = None, **kwargs) -> None:
+        search_values = self.get_search_values()
+        # values loaded from the db are remembered, unknown ones are always rewritten
+        search_changed = not self._saved_in_db or search_values != getattr(self, "_search_values", None)
+        if update_fields is not None and not set(SEARCH_FIELDS) & set(update_fields):
+            search_changed = False
+
+        if using_db is None:
+            async with in_transaction(self._meta.default_connection) as conn:
+                await self._save_with_search_terms(conn, update_fields, search_changed, **kwargs)
+        else:
+            await self._save_with_search_terms(using_db, update_fields, search_changed, **kwargs)
+        self._search_values = search_values
+
+        # read-your-writes: drop the cached user here and, over pub/sub, in the other workers
+        await self.delete_cache(self.id)
+        if update_fields is None or {"email", "username"} & set(update_fields):
+            try:
+                await cache.delete(UNKNOWN_IDENTIFIER_KEY.format(self.email),
+                                   UNKNOWN_IDENTIFIER_KEY.format(self.username))
+            except RedisError as e:
+                logger.warning(f"unknown identifier cache unavailable: {e}")
+
+    async def _save_with_search_terms(self, conn, update_fields, search_changed: bool, **kwargs) -> None:
+        # the user row is written first, its row lock serializes concurrent rewrites of the terms
+        await super().save(using_db=conn, update_fields=update_fields, **kwargs)
+        if search_changed:
+            await self.update_search_terms(conn)
 
     @classmethod
     async def create(cls, user: BaseUserCreate) -> "User":
         user_dict = user.model_dump(exclude_unset=True)
-        password_hash = password.get_password_hash(password=user.password)
+        password_hash = await password.password_hasher.hash(user.password)
         model = cls(**user_dict, password_hash=password_hash)
         await model.save()
         return model
 
     @classmethod
     async def delete_cache(cls, user_id: str) -> None:
-        await model_cache.delete(f"user:{user_id}")
+        await tiered_cache.delete(f"user:{user_id}")
+
+    @classmethod
+    async def delete_caches(cls, user_ids: Iterable[int]) -> None:
+        await tiered_cache.delete_many(f"user:{user_id}" for user_id in user_ids)
 
     class Meta:
         table = 'users'
@@ -77,3 +199,23 @@ class User(BaseDBModel, BaseCreatedUpdatedAtModel, UUIDDBModel):
 
     def __str__(self):
         return f"<User:{self.id} {self.username} {self.email}>"
+
+
+# upper bound of a prefix range, sorts after any character that can follow the prefix
+SEARCH_TERM_MAX_CHAR = "\U0010ffff"
+
+
+class UserSearchTerm(Model):
+    """
+    Prefix index of the user search fields, maintained by User.save.
+    The (term, user) unique index serves the range lookups of User.search.
+    There is no reverse relation on User, so the rows never show up in to_dict or the schemas.
+    """
+    id = fields.BigIntField(pk=True)
+    term = fields.CharField(max_length=255)
+    user: fields.ForeignKeyRelation[User] = fields.ForeignKeyField(
+        "models.User", related_name=False, on_delete=fields.CASCADE, index=True)
+
+    class Meta:
+        table = 'user_search_terms'
+        unique_together = (("term", "user"),)
@@ -0,0 +1,38 @@
+"""
+Fill the user search index, run it once at deploy after the index table was
+introduced, and after bulk imports that bypassed User.save:
+
+    PYTHONPATH="./" python -m app.applications.users.rebuild_search_terms
+
+It is idempotent, every user's terms are rewritten batch by batch.
+"""
+import argparse
+import logging
+import time
+
+from tortoise import Tortoise, run_async
+
+from app.applications.users.models import User, UserSearchTerm
+from app.core.init_app import TORTOISE_ORM
+
+logger = logging.getLogger(__name__)
+
+
+async def main(batch_size: int):
+    await Tortoise.init(config=TORTOISE_ORM)
+    # creates the index table on a database the app hasn't started on yet
+    await Tortoise.generate_schemas(safe=True)
+
+    start = time.perf_counter()
+    await User.rebuild_search_terms(batch_size=batch_size)
+    logger.info(f"rebuilt {await UserSearchTerm.all().count()} search terms "
+                f"for {await User.all().count()} users in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the user search index.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    # run_async closes the connections when done
+    run_async(main(args.batch_size))
@@ -1,15 +1,28 @@
-from fastapi import BackgroundTasks
-from app.core.auth.deps import get_current_active_superuser, get_current_active_user, permissions_required
+import os
+import shutil
+import uuid
+
+from celery.result import AsyncResult
+from fastapi import BackgroundTasks, UploadFile
+from starlette.concurrency import run_in_threadpool
+from app.core.auth.deps import get_current_active_superuser, get_current_active_user, get_current_active_db_user, permissions_required
+from app.core.auth.schemas import TokenUser
 
 from app.core.auth.utils.contrib import send_new_account_email
-from app.core.auth.utils.password import get_password_hash
+from app.core.auth.utils.password import password_hasher
+from app.core.auth.utils.permission import invalidate_claims
 
+from app.core.base.pagination import Keyset, paginate
+from app.core.base.responses import FastJSONResponse
 from app.core.base.schemas import ResponseData
+from app.core.celery import celery_app
+from app.core.tasks import import_users as import_users_task
 
+from app.applications.users.importer import IMPORT_FORMATS
 from app.applications.users.models import User
 from app.applications.users.schemas import BaseUserOut, BaseUserCreate, BaseUserUpdate, BaseUserMeOut, BaseUserOutList
 
-from typing import List, Optional
+from typing import List, Optional, Union
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 
@@ -26,18 +39,13 @@ async def read_users(page: Optional[int] = Query(title="page", ge=1, default=1),
                      page_size: Optional[int] = Query(
         title="page_size", le=20, default=10),
         keywords: Optional[str] = None,
-        current_user: User = Depends(get_current_active_user)):
-    query = User.all()
-    if keywords:
-        query = query.filter(name__icontains=keywords)
-
-    total = await query.count()
-    items = await query.offset((page-1) * page_size).limit(page_size).all()
+        cursor: Optional[str] = None,
+        current_user: Union[User, TokenUser] = Depends(get_current_active_user)):
+    query = User.search(keywords) if keywords else User.all()
 
-    return {"data": {
-        "total": total,
-        "items": items
-    }}
+    data = await paginate(query, Keyset(User), page_size, cursor=cursor, page=page,
+                          total_key=f"users:{keywords or ''}")
+    return FastJSONResponse(ResponseData[BaseUserOutList](data=data))
 
 
 # @router.get("/", response_model=List[BaseUserOut], status_code=200)
@@ -57,7 +65,7 @@ async def read_users(page: Optional[int] = Query(title="page", ge=1, default=1),
 async def create_user(
     *,
     user_in: BaseUserCreate,
-    current_user: User = Depends(get_current_active_superuser),
+    current_user: Union[User, TokenUser] = Depends(get_current_active_superuser),
     background_tasks: BackgroundTasks
 ):
     """
@@ -70,10 +78,7 @@ async def create_user(
             detail="The user with this username already exists in the system.",
         )
 
-    hashed_password = get_password_hash(user_in.password)
-    db_user = BaseUserCreate(
-        **user_in.create_update_dict(), hashed_password=hashed_password
-    )
+    db_user = BaseUserCreate(**user_in.create_update_dict())
     created_user = await User.create(db_user)
 
     if settings.EMAILS_ENABLED and user_in.email:
@@ -83,17 +88,57 @@ async def create_user(
     return created_user
 
 
+def _spool_upload(file: UploadFile, suffix: str) -> str:
+    os.makedirs(settings.IMPORT_SPOOL_DIR, exist_ok=True)
+    path = os.path.join(settings.IMPORT_SPOOL_DIR, f"{uuid.uuid4().hex}{suffix}")
+    with open(path, "wb") as f:
+        shutil.copyfileobj(file.file, f, 1024 * 1024)
+    return path
+
+
+@router.post("/import", response_model=ResponseData[dict], status_code=202)
+async def import_users(
+    file: UploadFile,
+    notify: bool = True,
+    current_user: Union[User, TokenUser] = Depends(get_current_active_superuser),
+):
+    """
+    Bulk import users from a CSV (with a header row) or NDJSON upload,
+    rows have the BaseUserCreate fields plus a required username.
+    The import runs in a celery worker, follow it with GET /import/{task_id}.
+    """
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    fmt = IMPORT_FORMATS.get(suffix)
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="Only .csv, .ndjson and .jsonl files can be imported")
+
+    path = await run_in_threadpool(_spool_upload, file, suffix)
+    task = await run_in_threadpool(import_users_task.delay, path, fmt, notify and settings.EMAILS_ENABLED)
+    return {"data": {"task_id": task.id}}
+
+
+@router.get("/import/{task_id}", response_model=ResponseData[dict], status_code=200)
+def import_users_status(task_id: str, current_user: Union[User, TokenUser] = Depends(get_current_active_superuser)):
+    """
+    State of a bulk import: PENDING, PROGRESS, SUCCESS or FAILURE, with the import report.
+    """
+    result = AsyncResult(task_id, app=celery_app)
+    info = result.info
+    if isinstance(info, Exception):
+        info = {"error": str(info)}
+    return {"data": {"state": result.state, "result": info}}
+
+
 @router.put("/me", response_model=ResponseData[BaseUserOut], status_code=200)
 async def update_user_me(
     user_in: BaseUserUpdate,
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_db_user)
 ):
     """
     Update own user.
     """
     if user_in.password is not None:
-        hashed_password = get_password_hash(user_in.password)
-        current_user.hashed_password = hashed_password
+        current_user.password_hash = await password_hasher.hash(user_in.password)
     if user_in.username is not None:
         current_user.username = user_in.username
     if user_in.email is not None:
@@ -105,7 +150,7 @@ async def update_user_me(
 
 @router.get("/me", response_model=ResponseData[BaseUserMeOut], status_code=200,)
 async def read_user_me(
-    current_user: User = Depends(get_current_active_user),
+    current_user: User = Depends(get_current_active_db_user),
 ):
     """
     Get current user.
@@ -120,13 +165,13 @@ async def read_user_me(
 @router.get("/{user_id}", response_model=BaseUserOut, status_code=200)
 async def read_user_by_id(
     user_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Union[User, TokenUser] = Depends(get_current_active_user),
 ):
     """
     Get a specific user by id.
     """
     user = await User.get(id=user_id)
-    if user == current_user:
+    if user.id == current_user.id:
         return user
     if not current_user.is_superuser:
         raise HTTPException(
@@ -139,7 +184,7 @@ async def read_user_by_id(
 async def update_user(
     user_id: int,
     user_in: BaseUserUpdate,
-    current_user: User = Depends(get_current_active_superuser),
+    current_user: Union[User, TokenUser] = Depends(get_current_active_superuser),
 ):
     """
     Update a user.
@@ -152,4 +197,5 @@ async def update_user(
         )
     user = await user.update_from_dict(user_in.create_update_dict_superuser())
     await user.save()
+    await invalidate_claims([user.id])
     return user
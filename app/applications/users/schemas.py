@@ -4,6 +4,8 @@ from typing import Optional, TypeVar
 
 from pydantic import BaseModel, EmailStr, UUID4, validator
 
+from app.core.base.schemas import PageData
+
 
 class BaseProperties(BaseModel):
     # @validator("hashed_id", pre=True, always=True, check_fields=False)
@@ -97,6 +99,5 @@ class BaseUserOut(BaseUser):
         from_attributes = True
 
 
-class BaseUserOutList(BaseModel):
-    total: int
-    items: list[BaseUserOut]
+class BaseUserOutList(PageData[BaseUserOut]):
+    pass
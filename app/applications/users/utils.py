@@ -1,9 +1,78 @@
+import asyncio
+import logging
 from datetime import datetime
+from typing import Optional
 
 from app.applications.users.models import User
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LastLoginBuffer:
+    """
+    Write-behind buffer for users.last_login.
+    Logins only record (user_id, timestamp) in memory, a background task writes
+    them every `interval` seconds (or once `max_size` users are pending)
+    as one bulk UPDATE ... CASE of the last_login column.
+    """
+
+    def __init__(self,
+                 interval: float = settings.LAST_LOGIN_FLUSH_INTERVAL,
+                 max_size: int = settings.LAST_LOGIN_BUFFER_SIZE):
+        self.interval = interval
+        self.max_size = max_size
+        self._pending: dict[int, datetime] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, user_id: int, timestamp: Optional[datetime] = None) -> None:
+        self._pending[user_id] = timestamp or datetime.now()
+        if len(self._pending) >= self.max_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        users = [User(id=user_id, last_login=timestamp) for user_id, timestamp in pending.items()]
+        try:
+            await User.bulk_update(users, fields=["last_login"], batch_size=self.max_size)
+        except Exception as e:
+            logger.warning(f"flush last_login of {len(pending)} users failed: {e}")
+            # keep newer logins recorded while the write was in flight
+            for user_id, timestamp in pending.items():
+                self._pending.setdefault(user_id, timestamp)
+            return 0
+        return len(pending)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = self._wakeup = None
+        await self.flush()
+
+
+last_login_buffer = LastLoginBuffer()
 
 
 async def update_last_login(user_id: int) -> None:
-    user = await User.get(id=user_id)
-    user.last_login = datetime.now()
-    await user.save()
+    last_login_buffer.add(user_id)
@@ -2,10 +2,11 @@ from typing import Union, Annotated
 
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from app.applications.users.models import User
-from app.core.auth.schemas import JWTTokenPayload
+from app.core.auth.schemas import JWTTokenPayload, TokenUser
 from app.core.auth.utils.captcha import verify_captcha
 from app.core.auth.utils.jwt import ALGORITHM
-from app.core.cache import model_cache
+from app.core.auth.utils.permission import claims_version, get_roles_permissions, get_user_permissions
+from app.core.cache import tiered_cache
 from app.core.config import settings
 from app.core.auth.schemas import CredentialsSchema
 
@@ -35,43 +36,61 @@ async def get_access_token_data(token: str = Security(reusable_oauth2)) -> Optio
     return token_data
 
 
-async def get_current_user(token: str = Security(reusable_oauth2)) -> Optional[User]:
+async def load_user(user_id: int) -> Optional[User]:
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY,
-                             algorithms=[ALGORITHM])
-        token_data = JWTTokenPayload(**payload)
-    except JWTError:
-        raise HTTPException(
-            status_code=HTTP_403_FORBIDDEN, detail="Could not validate credentials"
-        )
+        return await User.get(id=user_id).prefetch_related('groups')
+    except Exception:
+        return None
+
 
+async def is_token_current(token_data: JWTTokenPayload) -> bool:
+    """The claims of the user didn't change since a stateless token was issued."""
+    return token_data.claims_version is not None \
+        and token_data.claims_version >= await claims_version.get(token_data.user_id)
+
+
+async def get_current_user(token_data: JWTTokenPayload = Security(get_access_token_data)) -> Optional[User]:
     try:
-        cached_user = await model_cache.get(f"user:{token_data.user_id}")
+        # concurrent misses share one load, hot entries refresh before expiring,
+        # User.save and group membership changes evict the entry
+        user = await tiered_cache.get_or_load(f"user:{token_data.user_id}",
+                                              lambda: load_user(token_data.user_id),
+                                              ttl=600, early_refresh=True)
     except Exception:
-        cached_user = None
-
-    if cached_user:
-        user = cached_user
-    else:
-        try:
-            user = await User.get(id=token_data.user_id).prefetch_related('groups')
-        except Exception:
-            user = None
-        if user:
-            await model_cache.set(f"user:{token_data.user_id}", user, 600)
+        user = await load_user(token_data.user_id)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 
-async def get_current_active_user(current_user: User = Security(get_current_user)):
+async def get_token_user(token_data: JWTTokenPayload = Security(get_access_token_data)) -> Union[User, TokenUser]:
+    """
+    With JWT_STATELESS the token claims are trusted as long as the claims
+    version of the user wasn't bumped since the token was issued,
+    otherwise the cached user is used.
+    """
+    if settings.JWT_STATELESS and await is_token_current(token_data):
+        return TokenUser(id=token_data.user_id,
+                         is_active=token_data.is_active,
+                         is_superuser=token_data.is_superuser,
+                         roles=token_data.roles or [])
+    return await get_current_user(token_data)
+
+
+async def get_current_active_user(current_user: Union[User, TokenUser] = Security(get_token_user)):
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+
+async def get_current_active_db_user(current_user: User = Security(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 
-async def get_current_active_superuser(current_user: User = Security(get_current_user)):
+async def get_current_active_superuser(current_user: Union[User, TokenUser] = Security(get_token_user)):
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=400, detail="The user doesn't have enough privileges"
@@ -80,15 +99,18 @@ async def get_current_active_superuser(current_user: User = Security(get_current
 
 
 def permissions_required(permissions: Optional[List[str]] = None):
-    async def user_has_permission(user: User = Security(get_current_user)) -> User:
+    async def user_has_permission(user: Union[User, TokenUser] = Security(get_token_user)) -> Union[User, TokenUser]:
         if user.is_superuser:
             return user
         if not permissions:
             return user
 
-        for need_permission in permissions:
-            if need_permission not in user.permissions:
-                raise HTTPException(status_code=403, detail="没有权限")
+        if isinstance(user, TokenUser):
+            granted = await get_roles_permissions(user.roles)
+        else:
+            granted = await get_user_permissions(user.id)
+        if not granted.issuperset(permissions):
+            raise HTTPException(status_code=403, detail="没有权限")
 
         return user
 
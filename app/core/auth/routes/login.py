@@ -13,8 +13,8 @@ from app.core.auth.utils.contrib import (generate_password_reset_token,
                                          send_reset_password_email,
                                          verify_password_reset_token,
                                          authenticate)
-from app.core.auth.utils.jwt import create_access_token
-from app.core.auth.utils.password import get_password_hash
+from app.core.auth.utils.jwt import create_user_access_token
+from app.core.auth.utils.password import password_hasher
 from app.core.auth.utils.captcha import get_captcha, verify_captcha
 from app.core.base.schemas import ResponseData
 from app.core.config import settings
@@ -30,8 +30,7 @@ async def login(user: User = Depends(authentication_required), verified: bool =
     return {
         "code": 0,
         "data": {
-            "access_token": create_access_token(data={"user_id": user.id},
-                                                expires_delta=access_token_expires),
+            "access_token": await create_user_access_token(user, expires_delta=access_token_expires),
             "token_type": "bearer",
         },
         "msg": "Login successful"
@@ -42,8 +41,7 @@ async def login(user: User = Depends(authentication_required), verified: bool =
 async def login_access_token(user=Depends(authentication_required)):
     access_token_expires = timedelta(seconds=settings.JWT_EXPIRE)
     return {
-        "access_token": create_access_token(data={"user_id": user.id},
-                                            expires_delta=access_token_expires),
+        "access_token": await create_user_access_token(user, expires_delta=access_token_expires),
         "token_type": "bearer",
     }
 
@@ -62,7 +60,7 @@ async def recover_password(email: str, background_tasks: BackgroundTasks):
         )
     password_reset_token = generate_password_reset_token(email=email)
     background_tasks.add_task(
-        send_reset_password_email, email_to=user.email, email=email, token=password_reset_token)
+        send_reset_password_email, email_to=user.email, username=user.username, token=password_reset_token)
     return {"msg": "Password recovery email sent"}
 
 
@@ -82,8 +80,7 @@ async def reset_password(token: str = Body(...), new_password: str = Body(...)):
         )
     elif not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    hashed_password = get_password_hash(new_password)
-    user.hashed_password = hashed_password
+    user.password_hash = await password_hasher.hash(new_password)
     await user.save()
     return {"msg": "Password updated successfully"}
 
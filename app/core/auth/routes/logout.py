@@ -5,10 +5,11 @@ from app.core.auth.deps import get_current_active_superuser, get_current_active_
 
 from app.core.auth.utils.contrib import send_new_account_email
 from app.applications.users.models import User
+from app.core.auth.schemas import TokenUser
 
 router = APIRouter()
 
 
 @router.delete("/")
-async def logout(current_user: User = Depends(get_current_active_user)):
+async def logout(current_user: Union[User, TokenUser] = Depends(get_current_active_user)):
     return current_user
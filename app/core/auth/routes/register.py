@@ -5,7 +5,7 @@ from pydantic import BaseModel, EmailStr, UUID4, validator, Field
 from datetime import timedelta
 from typing import Optional, TypeVar, Generic, Union
 from fastapi import APIRouter, Body, HTTPException, BackgroundTasks, Depends, Form
-from app.core.auth.deps import get_current_active_superuser, get_current_active_user
+from app.core.auth.deps import get_current_active_superuser, get_current_active_user, get_current_active_db_user
 
 from app.core.auth.utils.contrib import send_new_account_email, generate_account_confirm_token, send_account_confirm_email, verify_account_confirm_token
 from app.applications.users.models import User
@@ -78,7 +78,7 @@ async def account_confirm(token: str):
 
 
 @router.get("/rquest-account-confirm")
-async def rquest_account_confirm(background_tasks: BackgroundTasks, current_user: User = Depends(get_current_active_user),):
+async def rquest_account_confirm(background_tasks: BackgroundTasks, current_user: User = Depends(get_current_active_db_user),):
     """
     Request account confirm
     """
@@ -1,5 +1,5 @@
 from typing import Optional
-from pydantic import BaseModel, EmailStr, model_validator, ValidationError, validate_email
+from pydantic import BaseModel, EmailStr, Field, model_validator, ValidationError, validate_email
 
 
 class CredentialsSchema(BaseModel):
@@ -31,6 +31,21 @@ class JWTTokenData(BaseModel):
 
 class JWTTokenPayload(BaseModel):
     user_id: int = None
+    # stateless claims, only present when JWT_STATELESS is enabled
+    is_active: Optional[bool] = Field(default=None, alias="act")
+    is_superuser: Optional[bool] = Field(default=None, alias="su")
+    claims_version: Optional[int] = Field(default=None, alias="cv")
+    roles: Optional[list[str]] = None
+
+
+class TokenUser(BaseModel):
+    """
+    User rebuilt from stateless token claims, the row is not loaded
+    """
+    id: int
+    is_active: bool
+    is_superuser: bool
+    roles: list[str] = []
 
 
 class Msg(BaseModel):
@@ -1,4 +1,8 @@
+import asyncio
+import logging
 import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
 from PIL import Image, ImageDraw, ImageFont
 from app.core.auth.utils.password import get_password_hash, verify_and_update_password
 import uuid
@@ -8,6 +12,8 @@ import base64
 from app.core.config import settings
 from app.core.cache import cache
 
+logger = logging.getLogger(__name__)
+
 font = ImageFont.FreeTypeFont(settings.CAPTCHA_FONT_PATH, size=25)
 
 
@@ -66,11 +72,113 @@ def random_problem(difficulty: int = 10):
     return (problem, answer)
 
 
+def render_captchas(count: int, difficulty: int = 10) -> list[tuple[str, str]]:
+    """
+    Render count (image, answer) pairs, runs in the captcha process pool
+    """
+    result = []
+    for _ in range(count):
+        problem, answer = random_problem(difficulty)
+        result.append((create_captcha(problem), answer))
+    return result
+
+
+class CaptchaPool:
+    """
+    Bounded queue of pre-rendered (image, answer) pairs.
+    Images are rendered in batches in a process pool, a background task
+    refills the queue whenever it drops below the low-water mark.
+    When the queue is drained, single images are rendered on a separate
+    fallback pool, so requests don't wait behind a refill batch.
+    """
+
+    def __init__(self,
+                 size: int = settings.CAPTCHA_POOL_SIZE,
+                 low_water: int = settings.CAPTCHA_POOL_LOW_WATER,
+                 batch: int = settings.CAPTCHA_POOL_BATCH,
+                 workers: int = settings.CAPTCHA_POOL_WORKERS,
+                 fallback_workers: int = settings.CAPTCHA_FALLBACK_WORKERS,
+                 difficulty: int = 10):
+        self.size = size
+        self.low_water = low_water
+        self.batch = batch
+        self.workers = workers
+        self.fallback_workers = fallback_workers
+        self.difficulty = difficulty
+        self.queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._fallback_executor: Optional[ProcessPoolExecutor] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self.queue = asyncio.Queue(maxsize=self.size)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._fallback_executor = ProcessPoolExecutor(max_workers=self.fallback_workers)
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        self._task = asyncio.create_task(self._refill())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._fallback_executor.shutdown(wait=False, cancel_futures=True)
+        self._task = self._executor = self._fallback_executor = self.queue = None
+
+    async def _refill(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while not self.queue.full():
+                count = min(self.batch, self.size - self.queue.qsize())
+                try:
+                    batch = await loop.run_in_executor(
+                        self._executor, render_captchas, count, self.difficulty)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"render captchas failed: {e}")
+                    await asyncio.sleep(1)
+                    continue
+                for item in batch:
+                    if self.queue.full():
+                        break
+                    self.queue.put_nowait(item)
+
+    async def pop(self, difficulty: int = 10) -> tuple[str, str]:
+        item = None
+        if self.queue is not None and difficulty == self.difficulty:
+            try:
+                item = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            if self.queue.qsize() < self.low_water:
+                self._wakeup.set()
+
+        if item is None:
+            # pool not started or drained, still keep rendering off the event loop
+            loop = asyncio.get_running_loop()
+            item = (await loop.run_in_executor(self._fallback_executor, render_captchas, 1, difficulty))[0]
+        return item
+
+
+captcha_pool = CaptchaPool()
+
+
 async def get_captcha(difficulty: int = 10):
-    problem, answer = random_problem(difficulty)
+    image, answer = await captcha_pool.pop(difficulty)
     uuid_str = str(uuid.uuid4())
     await cache.set(f"fast_captcha:{uuid_str}", answer, ex=300)
-    return (create_captcha(problem), uuid_str)
+    return (image, uuid_str)
 
 
 async def verify_captcha(answer: str, captcha_id: str):
@@ -1,46 +1,45 @@
 import logging
 from datetime import datetime, timedelta
-from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
 
-import emails
 from jose import JWTError, jwt
-from emails.template import JinjaTemplate
 
 from app.applications.users.models import User
 from app.core.auth.utils import password
 from app.core.config import settings
+from app.core.mail import enqueue_emails
+from app.core.templates import email_templates
 from app.core.auth.schemas import CredentialsSchema
 
 PASSWORD_RESET_JWT_SUBJECT = "passwordreset"
 
+# columns needed to verify the password and issue the access token
+AUTHENTICATE_FIELDS = ("password_hash", "is_active", "is_superuser")
+
+
+def send_email(email_to: str, subject: str, template_name: str, environment: dict):
+    """
+    Render the message and queue it in the email outbox, delivery happens in the celery workers.
+    """
+    enqueue_emails([{
+        "to": email_to,
+        "subject": subject,
+        "html": email_templates.render(template_name, **environment),
+    }])
 
-def send_email(email_to: str, subject_template="", html_template="", environment={}):
-    assert settings.EMAILS_ENABLED, "no provided configuration for email variables"
-    message = emails.Message(
-        subject=JinjaTemplate(subject_template),
-        html=JinjaTemplate(html_template),
-        mail_from=(settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL),
-    )
-    smtp_options = {"host": settings.SMTP_HOST, "port": settings.SMTP_PORT}
-    if settings.SMTP_TLS:
-        smtp_options["tls"] = True
-    if settings.SMTP_SSL:
-        smtp_options["ssl"] = True
-    if settings.SMTP_USER:
-        smtp_options["user"] = settings.SMTP_USER
-    if settings.SMTP_PASSWORD:
-        smtp_options["password"] = settings.SMTP_PASSWORD
-    response = message.send(to=email_to, render=environment, smtp=smtp_options)
-    logging.info(f"send email result: {response}")
-    return response
+
+def send_template_emails(template_name: str, recipients: Iterable[tuple[str, str, dict]]) -> int:
+    """
+    Queue one message per (email_to, subject, environment) rendered with the same compiled template.
+    """
+    template = email_templates.get(template_name)
+    return enqueue_emails({"to": email_to, "subject": subject, "html": template.render(**environment)}
+                          for email_to, subject, environment in recipients)
 
 
 def send_reset_password_email(email_to: str, username: str, token: str):
     project_name = settings.PROJECT_NAME
     subject = f"{project_name} - Password recovery for user {email_to}"
-    with open(Path(settings.EMAIL_TEMPLATES_DIR) / "password_reset.html") as f:
-        template_str = f.read()
     if hasattr(token, "decode"):
         use_token = token.decode()
     else:
@@ -49,8 +48,8 @@ def send_reset_password_email(email_to: str, username: str, token: str):
     link = f"{server_host}/auth/reset-password?token={use_token}"
     send_email(
         email_to=email_to,
-        subject_template=subject,
-        html_template=template_str,
+        subject=subject,
+        template_name="password_reset.html",
         environment={
             "project_name": settings.PROJECT_NAME,
             "username": username,
@@ -64,13 +63,11 @@ def send_reset_password_email(email_to: str, username: str, token: str):
 def send_new_account_email(email_to: str, username: str, password: str):
     project_name = settings.PROJECT_NAME
     subject = f"{project_name} - New account for user {username}"
-    with open(Path(settings.EMAIL_TEMPLATES_DIR) / "new_account.html") as f:
-        template_str = f.read()
     link = settings.LOGIN_URL
     return send_email(
         email_to=email_to,
-        subject_template=subject,
-        html_template=template_str,
+        subject=subject,
+        template_name="new_account.html",
         environment={
             "project_name": settings.PROJECT_NAME,
             "username": username,
@@ -81,31 +78,43 @@ def send_new_account_email(email_to: str, username: str, password: str):
     )
 
 
-def send_account_confirm_email(email_to: str, username: str, token: str):
+def _account_confirm_message(email_to: str, username: str, token: str) -> tuple[str, str, dict]:
     project_name = settings.PROJECT_NAME
     subject = f"{project_name} - Confirm account for user {username}"
-    with open(Path(settings.EMAIL_TEMPLATES_DIR) / "confirm_account.html") as f:
-        template_str = f.read()
     if hasattr(token, "decode"):
         user_token = token.decode()
     else:
         user_token = token
     server_host = settings.SERVER_HOST
     link = f"{server_host}/api/auth/register/account-confirm?token={user_token}"
+    return email_to, subject, {
+        "project_name": settings.PROJECT_NAME,
+        "username": username,
+        "email": email_to,
+        "valid_hours": settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS,
+        "link": link,
+    }
+
+
+def send_account_confirm_email(email_to: str, username: str, token: str):
+    email_to, subject, environment = _account_confirm_message(email_to, username, token)
     return send_email(
         email_to=email_to,
-        subject_template=subject,
-        html_template=template_str,
-        environment={
-            "project_name": settings.PROJECT_NAME,
-            "username": username,
-            "email": email_to,
-            "valid_hours": settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS,
-            "link": link,
-        },
+        subject=subject,
+        template_name="confirm_account.html",
+        environment=environment,
     )
 
 
+def send_account_confirm_emails(users: Iterable[tuple[int, str, str]]) -> int:
+    """
+    Queue confirm emails for many (user_id, email, username) at once, e.g. after a bulk import.
+    """
+    return send_template_emails("confirm_account.html", (
+        _account_confirm_message(email, username, generate_account_confirm_token(user_id, email))
+        for user_id, email, username in users))
+
+
 def generate_password_reset_token(email):
     delta = timedelta(hours=settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS)
     now = datetime.utcnow()
@@ -152,21 +161,12 @@ def verify_account_confirm_token(token) -> Optional[tuple]:
 
 
 async def authenticate(credentials: CredentialsSchema) -> Optional[User]:
-    print(credentials)
-    user = None
-    if credentials.email:
-        user = await User.get_by_email(credentials.email)
-
-    if user is None and credentials.username:
-        user = await User.get_by_username(credentials.username)
-
-    if user is None and credentials.username:
-        user = await User.get_by_email(credentials.username)
-
+    user = await User.get_by_identifiers((credentials.email, credentials.username),
+                                         only=AUTHENTICATE_FIELDS)
     if user is None:
         return None
 
-    verified, updated_password_hash = password.verify_and_update_password(
+    verified, updated_password_hash = await password.password_hasher.verify_and_update(
         credentials.password, user.password_hash
     )
 
@@ -175,5 +175,5 @@ async def authenticate(credentials: CredentialsSchema) -> Optional[User]:
         # Update password hash to a more robust one if needed
     if updated_password_hash is not None:
         user.password_hash = updated_password_hash
-        await user.save()
+        await user.save(update_fields=["password_hash"])
     return user
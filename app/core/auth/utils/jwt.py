@@ -2,6 +2,7 @@ from datetime import datetime, timedelta
 
 from jose import jwt
 
+from app.core.auth.utils.permission import get_user_claims
 from app.core.config import settings
 
 ALGORITHM = "HS256"
@@ -18,3 +19,10 @@ def create_access_token(*, data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(
         to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+
+async def create_user_access_token(user, expires_delta: timedelta = None):
+    data = {"user_id": user.id}
+    if settings.JWT_STATELESS:
+        data.update(await get_user_claims(user))
+    return create_access_token(data=data, expires_delta=expires_delta)
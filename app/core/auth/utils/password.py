@@ -1,8 +1,13 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple
 
 from passlib import pwd
 from passlib.context import CryptContext
 
+from app.core.config import settings
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
@@ -18,3 +23,65 @@ def get_password_hash(password: str) -> str:
 
 def generate_password() -> str:
     return pwd.genword()
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a bounded thread pool, bcrypt releases the GIL while hashing
+    so the event loop keeps serving other requests during a login burst.
+    At most `concurrency` hashes run at once, the rest wait on the semaphore.
+    """
+
+    def __init__(self, concurrency: int = settings.PASSWORD_HASH_CONCURRENCY):
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="password")
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.waiting = 0
+        self.running = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.wait_time = 0.0
+        self.run_time = 0.0
+
+    async def _run(self, func, *args):
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        start = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        self.wait_time += started - start
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.run_time += time.perf_counter() - started
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, str]:
+        return await self._run(verify_and_update_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "avg_wait_ms": round(self.wait_time / completed * 1000, 2),
+            "avg_run_ms": round(self.run_time / completed * 1000, 2),
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,113 @@
+import sys
+from typing import Awaitable, Callable, Hashable, Iterable
+
+from app.core.cache import ScopedVersionCounter, VersionCounter
+
+# bumped whenever role, menu or role membership changes can alter a permission set
+permission_version = VersionCounter("permission")
+# per user, bumped whenever the stateless token claims of the user change:
+# active, superuser or the keys of its active roles, and on group membership
+# changes, so the user is read again with its current groups
+claims_version = ScopedVersionCounter("claims")
+
+PERMISSION_CACHE_SIZE = 10000
+
+_permission_sets: dict[Hashable, frozenset[str]] = {}
+_permission_sets_version = None
+
+
+async def _get_or_load(key: Hashable, loader: Callable[[], Awaitable[frozenset[str]]]) -> frozenset[str]:
+    global _permission_sets_version
+    version = await permission_version.get()
+    if version != _permission_sets_version:
+        _permission_sets.clear()
+        _permission_sets_version = version
+
+    permissions = _permission_sets.get(key)
+    if permissions is None:
+        permissions = await loader()
+        if _permission_sets_version == version:
+            if len(_permission_sets) >= PERMISSION_CACHE_SIZE:
+                _permission_sets.clear()
+            _permission_sets[key] = permissions
+    return permissions
+
+
+def _menu_permission_query(**filters):
+    from app.applications.system.models import Menu
+
+    return Menu.filter(roles__active=True,
+                       is_deleted=False,
+                       permission_key__isnull=False,
+                       **filters) \
+        .distinct().values_list("permission_key", flat=True)
+
+
+async def load_user_permissions(user_id: int) -> frozenset[str]:
+    keys = await _menu_permission_query(roles__users__id=user_id)
+    return frozenset(sys.intern(k) for k in keys if k)
+
+
+async def load_roles_permissions(role_keys: Iterable[str]) -> frozenset[str]:
+    keys = await _menu_permission_query(roles__key__in=list(role_keys))
+    return frozenset(sys.intern(k) for k in keys if k)
+
+
+async def get_user_permissions(user_id: int) -> frozenset[str]:
+    """
+    Frozen set of permission keys granted to the user through roles -> menus.
+    Built once per worker and permission version, then served from memory.
+    """
+    return await _get_or_load(user_id, lambda: load_user_permissions(user_id))
+
+
+async def get_roles_permissions(role_keys: Iterable[str]) -> frozenset[str]:
+    """
+    Same as get_user_permissions but for a set of role keys,
+    used when the roles come from token claims instead of the database.
+    """
+    role_keys = frozenset(role_keys)
+    if not role_keys:
+        return frozenset()
+    return await _get_or_load(role_keys, lambda: load_roles_permissions(role_keys))
+
+
+async def get_user_role_keys(user_id: int) -> list[str]:
+    from app.applications.system.models import Role
+
+    return await Role.filter(users__id=user_id, active=True) \
+        .order_by("sort", "id").values_list("key", flat=True)
+
+
+async def get_user_claims(user) -> dict:
+    """
+    Compact claims for stateless access tokens.
+    The version is read first, so a concurrent change leaves the token stale.
+    """
+    version = await claims_version.get(user.id)
+    return {
+        "act": user.is_active,
+        "su": user.is_superuser,
+        "cv": version,
+        "roles": await get_user_role_keys(user.id),
+    }
+
+
+async def invalidate_permissions() -> int:
+    _permission_sets.clear()
+    return await permission_version.bump()
+
+
+async def invalidate_claims(user_ids: Iterable[int]):
+    """
+    Make the stateless tokens of these users stale, they are served
+    from the cached user until a new token is issued.
+    """
+    await claims_version.bump(user_ids)
+
+
+async def get_role_user_ids(role_ids: Iterable[int]) -> list[int]:
+    from app.applications.system.models import Role
+
+    return await Role.filter(id__in=list(role_ids), users__id__isnull=False) \
+        .distinct().values_list("users__id", flat=True)
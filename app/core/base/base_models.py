@@ -1,6 +1,6 @@
 import uuid
 from tortoise import models, fields, expressions
-from app.core.cache import model_cache
+from app.core.cache import tiered_cache
 from typing import Any, Optional, Generic, TypeVar
 
 
@@ -10,19 +10,17 @@ class CacheModelMixin:
     only works with get and query by id
     """
     CACHE_KEY = "id"
+    CACHE_TTL = 600
 
     @classmethod
     async def get(cls, *args, **kwargs):
         if kwargs.get(cls.CACHE_KEY):
             try:
                 cache_key = f"CacheModel:{cls.__name__}:{kwargs.get(cls.CACHE_KEY)}"
-                cached_data = await model_cache.get(cache_key)
-                if cached_data:
-                    return cached_data
-                else:
-                    q: models.Model = await super().get(*args, **kwargs)
-                    await model_cache.set(cache_key, q, ttl=600)
-                    return q
+                # a fresh query per load, an early refresh or a retry can't await a spent one
+                return await tiered_cache.get_or_load(cache_key,
+                                                      lambda: super(CacheModelMixin, cls).get(*args, **kwargs),
+                                                      ttl=cls.CACHE_TTL)
             except Exception as e:
                 ...
 
@@ -31,7 +29,7 @@ class CacheModelMixin:
     @classmethod
     async def delete_cache(cls, key: int = None):
         cache_key = f"CacheModel:{cls.__name__}:{key}"
-        await model_cache.delete(cache_key)
+        await tiered_cache.delete(cache_key)
 
     async def save(self, *args, **kwargs):
         await super().save(*args, **kwargs)
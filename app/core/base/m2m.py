@@ -0,0 +1,150 @@
+from functools import cached_property
+from typing import Awaitable, Callable, Iterable, Optional
+
+from pypika import Table
+from pypika.functions import Count
+from tortoise.models import Model
+from tortoise.transactions import in_transaction
+
+# ids per IN (...) / VALUES statement
+CHUNK_SIZE = 1000
+
+
+def _chunks(ids: list, size: int = CHUNK_SIZE) -> Iterable[list]:
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+class ThroughTable:
+    """
+    Set based changes of a many to many relation, straight on its through table.
+    add and remove only read back the ids passed in, replace reads the related
+    ids of the owner as a single column. Every call runs in one transaction,
+    with IN lists and VALUES chunked to CHUNK_SIZE ids per statement.
+    on_change(pk, ids) is awaited after the commit with the related ids
+    actually added or removed, e.g. to evict their cached copies.
+
+        role_menus = ThroughTable(Role, "permissions")
+        added, removed = await role_menus.replace(role.id, menu_ids)
+    """
+
+    def __init__(self, model: type[Model], field: str,
+                 on_change: Optional[Callable[[object, list], Awaitable[None]]] = None):
+        self.model = model
+        self.field = field
+        self.on_change = on_change
+
+    # the relation is only resolved once Tortoise is initialised, so read it lazily
+
+    @cached_property
+    def _m2m(self):
+        return self.model._meta.fields_map[self.field]
+
+    @cached_property
+    def related_model(self) -> type[Model]:
+        return self._m2m.related_model
+
+    @cached_property
+    def table(self) -> Table:
+        return Table(self._m2m.through)
+
+    @cached_property
+    def owner_key(self) -> str:
+        return self._m2m.backward_key
+
+    @cached_property
+    def related_key(self) -> str:
+        return self._m2m.forward_key
+
+    def _connection(self):
+        return in_transaction(self.model._meta.default_connection)
+
+    @staticmethod
+    async def _column(conn, query) -> list:
+        """Values of a single column select, rows come back as dicts on every backend."""
+        return [next(iter(row.values())) for row in await conn.execute_query_dict(str(query))]
+
+    async def _existing(self, conn, pk, ids: list) -> set:
+        """Which of ids are already related to pk."""
+        existing = set()
+        for chunk in _chunks(ids):
+            query = conn.query_class.from_(self.table).select(self.table[self.related_key]) \
+                .where(self.table[self.owner_key] == pk) \
+                .where(self.table[self.related_key].isin(chunk))
+            existing.update(await self._column(conn, query))
+        return existing
+
+    async def _valid(self, conn, ids: list) -> list:
+        """ids that exist in the related table, in the given order."""
+        meta = self.related_model._meta
+        table = Table(meta.db_table)
+        valid = set()
+        for chunk in _chunks(ids):
+            query = conn.query_class.from_(table).select(table[meta.db_pk_column]) \
+                .where(table[meta.db_pk_column].isin(chunk))
+            valid.update(await self._column(conn, query))
+        return [i for i in ids if i in valid]
+
+    async def _changed(self, pk, ids: list) -> None:
+        if ids and self.on_change is not None:
+            await self.on_change(pk, ids)
+
+    async def _add(self, conn, pk, ids: list) -> list:
+        existing = await self._existing(conn, pk, ids)
+        new = [i for i in ids if i not in existing]
+        for chunk in _chunks(new):
+            query = conn.query_class.into(self.table).columns(self.owner_key, self.related_key) \
+                .insert(*((pk, i) for i in chunk))
+            await conn.execute_query(str(query))
+        return new
+
+    async def add(self, pk, ids: Iterable) -> int:
+        """Relate ids to pk, skipping existing rows and unknown ids, returns the number added."""
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return 0
+        async with self._connection() as conn:
+            new = await self._add(conn, pk, await self._valid(conn, ids))
+        await self._changed(pk, new)
+        return len(new)
+
+    async def _remove(self, conn, pk, ids: list) -> None:
+        for chunk in _chunks(ids):
+            query = conn.query_class.from_(self.table).delete() \
+                .where(self.table[self.owner_key] == pk) \
+                .where(self.table[self.related_key].isin(chunk))
+            await conn.execute_query(str(query))
+
+    async def remove(self, pk, ids: Iterable) -> int:
+        """Unrelate ids from pk, returns the number removed."""
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return 0
+        async with self._connection() as conn:
+            existing = list(await self._existing(conn, pk, ids))
+            await self._remove(conn, pk, existing)
+        await self._changed(pk, existing)
+        return len(existing)
+
+    async def replace(self, pk, ids: Iterable) -> tuple[int, int]:
+        """
+        Make ids the exact related set of pk, returns (added, removed).
+        The current related ids of pk are read as one column, so the stale
+        ones can be deleted in chunks like in remove.
+        """
+        ids = list(dict.fromkeys(ids))
+        async with self._connection() as conn:
+            ids = await self._valid(conn, ids)
+            query = conn.query_class.from_(self.table).select(self.table[self.related_key]) \
+                .where(self.table[self.owner_key] == pk)
+            keep = set(ids)
+            stale = [i for i in await self._column(conn, query) if i not in keep]
+            await self._remove(conn, pk, stale)
+            new = await self._add(conn, pk, ids)
+        await self._changed(pk, stale + new)
+        return len(new), len(stale)
+
+    async def count(self, pk) -> int:
+        conn = self.model._meta.db
+        query = conn.query_class.from_(self.table).select(Count("*")).where(self.table[self.owner_key] == pk)
+        return (await self._column(conn, query))[0]
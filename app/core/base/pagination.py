@@ -0,0 +1,118 @@
+import base64
+from typing import Any, Optional, Sequence
+
+import orjson
+from fastapi import HTTPException
+from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
+
+from app.core.cache import tiered_cache
+from app.core.config import settings
+
+NEXT = "n"
+PREV = "p"
+
+
+def encode_cursor(direction: str, values: list) -> str:
+    data = orjson.dumps([direction, *values], default=str)
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, list]:
+    try:
+        data = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        direction, *values = data
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if direction not in (NEXT, PREV):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return direction, values
+
+
+class Keyset:
+    """
+    Ordering of a keyset page: a not-null sort field plus the primary key as
+    tie-breaker, e.g. Keyset(Role, "sort") or Keyset(User, "-created_at").
+    """
+
+    def __init__(self, model, order: str = "id"):
+        self.model = model
+        self.descending = order.startswith("-")
+        pk = model._meta.pk_attr
+        field = order.lstrip("-")
+        self.fields = (field, pk) if field != pk else (pk,)
+
+    def order_by(self, reverse: bool = False) -> list[str]:
+        prefix = "-" if self.descending != reverse else ""
+        return [prefix + f for f in self.fields]
+
+    def values(self, row) -> list:
+        if isinstance(row, dict):
+            return [row[f] for f in self.fields]
+        return [getattr(row, f) for f in self.fields]
+
+    def after(self, values: list, reverse: bool = False) -> Q:
+        """Rows strictly after values in the (possibly reversed) order."""
+        if len(values) != len(self.fields):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        fields_map = self.model._meta.fields_map
+        try:
+            values = [fields_map[f].to_python_value(v) for f, v in zip(self.fields, values)]
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        op = "lt" if self.descending != reverse else "gt"
+
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+        condition = Q(**{f"{self.fields[-1]}__{op}": values[-1]})
+        for field, value in zip(reversed(self.fields[:-1]), reversed(values[:-1])):
+            condition = Q(**{f"{field}__{op}": value}) | (Q(**{field: value}) & condition)
+        return condition
+
+
+async def paginate(query: QuerySet,
+                   keyset: Keyset,
+                   page_size: int,
+                   cursor: Optional[str] = None,
+                   page: int = 1,
+                   total_key: Optional[str] = None,
+                   fields: Optional[Sequence[str]] = None) -> dict[str, Any]:
+    """
+    One page of query as {"total", "items", "next", "prev"}.
+
+    With a cursor the page is read with a range condition on the keyset, so it
+    costs the same at any depth; without one the legacy page number is used
+    as offset. next/prev are opaque cursors, None at either end.
+    The total is cached for PAGINATION_TOTAL_TTL seconds under total_key,
+    without a key it is not computed and returned as None.
+    With fields the items are plain values() dicts of those fields instead of model instances.
+    """
+    direction, values = decode_cursor(cursor) if cursor else (NEXT, None)
+    reverse = direction == PREV
+
+    page_query = query.order_by(*keyset.order_by(reverse))
+    if values is not None:
+        page_query = page_query.filter(keyset.after(values, reverse))
+    elif page > 1:
+        page_query = page_query.offset((page - 1) * page_size)
+    page_query = page_query.limit(page_size + 1)
+    if fields is not None:
+        page_query = page_query.values(*fields, *(f for f in keyset.fields if f not in fields))
+    rows = await page_query
+
+    more = len(rows) > page_size
+    items = rows[:page_size]
+    if reverse:
+        items.reverse()
+
+    has_next = not reverse and more or reverse
+    has_prev = reverse and more or not reverse and (values is not None or page > 1)
+    result = {
+        "total": None,
+        "items": items,
+        "next": encode_cursor(NEXT, keyset.values(items[-1])) if items and has_next else None,
+        "prev": encode_cursor(PREV, keyset.values(items[0])) if items and has_prev else None,
+    }
+    if total_key is not None:
+        result["total"] = await tiered_cache.get_or_load(
+            f"total:{total_key}", lambda: query.count(), ttl=settings.PAGINATION_TOTAL_TTL)
+    return result
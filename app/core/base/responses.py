@@ -0,0 +1,28 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic_core import to_jsonable_python
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    return to_jsonable_python(value)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson, the app wide default response class.
+
+    A pydantic model passed as content is written by its compiled serializer,
+    so a handler holding an already validated ResponseData can return
+    FastJSONResponse(model) and skip FastAPI's dump and revalidation
+    against the response_model.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.__pydantic_serializer__.to_json(content)
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
@@ -2,9 +2,21 @@ from typing import Optional, Generic, TypeVar
 from pydantic import BaseModel
 
 ReponseDataType = TypeVar("ReponseDataType", bound=BaseModel)
+PageItemType = TypeVar("PageItemType", bound=BaseModel)
 
 
 class ResponseData(BaseModel, Generic[ReponseDataType]):
     code: int = 0
     data: Optional[ReponseDataType] = None
     msg: Optional[str] = None
+
+
+class PageData(BaseModel, Generic[PageItemType]):
+    """
+    List envelope filled by app.core.base.pagination.paginate,
+    next/prev are opaque cursors for the neighbouring pages.
+    """
+    total: Optional[int] = None
+    items: list[PageItemType]
+    next: Optional[str] = None
+    prev: Optional[str] = None
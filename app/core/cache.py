@@ -1,27 +1,560 @@
-from aiocache.serializers import PickleSerializer
-from aiocache import caches
+import asyncio
+import functools
+import logging
+import math
+import random
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
 import redis.asyncio as redis
 
+from app.core.config import settings
+from app.core.serializers import ModelSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class RedisConnectionPool(redis.BlockingConnectionPool):
+    """
+    Blocking pool that also counts callers waiting for a connection
+    and connections created over its lifetime.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiting = 0
+        self.created = 0
+
+    def make_connection(self):
+        self.created += 1
+        return super().make_connection()
+
+    async def get_connection(self, *args, **kwargs):
+        self.waiting += 1
+        try:
+            return await super().get_connection(*args, **kwargs)
+        finally:
+            self.waiting -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_connections": self.max_connections,
+            "in_use": len(self._in_use_connections),
+            "idle": len(self._available_connections),
+            "waiting": self.waiting,
+            "created": self.created,
+        }
+
+
+def create_redis_pool() -> RedisConnectionPool:
+    return RedisConnectionPool.from_url(
+        settings.REDIS_URL,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        encoding="utf-8",
+        decode_responses=True,
+    )
+
+
+# one pool for the whole process: cache, model_cache, captcha and rate limiter
+redis_pool = create_redis_pool()
+cache = redis.Redis(connection_pool=redis_pool)
+
 
 def get_cache():
-    return redis.from_url("redis://localhost",
-                          encoding="utf-8", decode_responses=True)
+    return cache
+
+
+async def init_redis():
+    await cache.ping()
+
+
+async def close_redis():
+    await redis_pool.disconnect()
+
+
+class SerializedRedis:
+    """
+    A serializer in front of a redis client, with the get/set/delete
+    signatures of the aiocache backends. Unlike RedisCache it opens
+    no connection pool of its own.
+    """
+
+    def __init__(self, client: redis.Redis, serializer):
+        self.client = client
+        self.serializer = serializer
+
+    async def get(self, key: str, loads_fn: Callable = None) -> Any:
+        value = await self.client.get(key)
+        return None if value is None else (loads_fn or self.serializer.loads)(value)
+
+    async def set(self, key: str, value: Any, ttl: int = None, dumps_fn: Callable = None) -> None:
+        await self.client.set(key, (dumps_fn or self.serializer.dumps)(value), ex=ttl)
+
+    async def delete(self, *keys: str) -> int:
+        return await self.client.delete(*keys)
+
+
+# ModelSerializer writes utf-8 JSON, so it is safe on the decoding shared client
+model_cache = SerializedRedis(cache, ModelSerializer())
+
+
+class VersionCounter:
+    """
+    Monotonically increasing counter stored in redis, shared by all workers.
+    The value is re-read at most once per check_interval seconds,
+    so hot paths don't leave the process.
+    """
+
+    def __init__(self, name: str, check_interval: float = None):
+        self.key = f"version:{name}"
+        self.check_interval = settings.CACHE_VERSION_CHECK_INTERVAL \
+            if check_interval is None else check_interval
+        self._value: Optional[int] = None
+        self._checked_at = 0.0
+
+    async def get(self) -> int:
+        now = time.monotonic()
+        if self._value is None or now - self._checked_at >= self.check_interval:
+            try:
+                self._value = int(await cache.get(self.key) or 0)
+            except Exception as e:
+                logger.warning(f"read {self.key} failed: {e}")
+                self._value = self._value or 0
+            self._checked_at = now
+        return self._value
+
+    async def bump(self) -> int:
+        try:
+            self._value = int(await cache.incr(self.key))
+        except Exception as e:
+            logger.warning(f"bump {self.key} failed: {e}")
+            self._value = (self._value or 0) + 1
+        self._checked_at = time.monotonic()
+        return self._value
+
+
+class ScopedVersionCounter:
+    """
+    A VersionCounter per scope, e.g. per user id, stored under version:{name}:{scope}.
+    Values are re-read at most once per check_interval seconds, the most
+    recently read max_size scopes are kept in the process.
+    """
+
+    def __init__(self, name: str, check_interval: float = None, max_size: int = 10000):
+        self.name = name
+        self.check_interval = settings.CACHE_VERSION_CHECK_INTERVAL \
+            if check_interval is None else check_interval
+        self.max_size = max_size
+        # scope -> (value, checked at)
+        self._values: OrderedDict[Any, tuple[int, float]] = OrderedDict()
+
+    def key(self, scope) -> str:
+        return f"version:{self.name}:{scope}"
+
+    def _remember(self, scope, value: int, now: float):
+        self._values[scope] = (value, now)
+        self._values.move_to_end(scope)
+        while len(self._values) > self.max_size:
+            self._values.popitem(last=False)
+
+    async def get(self, scope) -> int:
+        now = time.monotonic()
+        entry = self._values.get(scope)
+        if entry is not None and now - entry[1] < self.check_interval:
+            return entry[0]
+        try:
+            value = int(await cache.get(self.key(scope)) or 0)
+        except Exception as e:
+            logger.warning(f"read {self.key(scope)} failed: {e}")
+            value = entry[0] if entry is not None else 0
+        self._remember(scope, value, now)
+        return value
+
+    async def bump(self, scopes: Iterable) -> None:
+        scopes = list(dict.fromkeys(scopes))
+        if not scopes:
+            return
+        try:
+            async with cache.pipeline(transaction=False) as pipe:
+                for scope in scopes:
+                    pipe.incr(self.key(scope))
+                values = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"bump version:{self.name} failed: {e}")
+            values = [self._values.get(scope, (0, 0.0))[0] + 1 for scope in scopes]
+        now = time.monotonic()
+        for scope, value in zip(scopes, values):
+            self._remember(scope, int(value), now)
+
+
+class VersionedCache:
+    """
+    Cache of pre-serialized bytes, invalidated as a whole by bumping its version.
+    Entries live in a per-worker dict in front of redis,
+    redis keys embed the version so stale entries simply expire.
+    """
+
+    def __init__(self, name: str, ttl: int = 60 * 60, check_interval: float = None):
+        self.name = name
+        self.ttl = ttl
+        self.version = VersionCounter(name, check_interval)
+        self._local: dict[str, bytes] = {}
+        self._local_version: Optional[int] = None
+
+    async def get_or_set(self, key: str, loader: Callable[[], Awaitable[bytes]]) -> bytes:
+        version = await self.version.get()
+        if version != self._local_version:
+            self._local.clear()
+            self._local_version = version
+
+        value = self._local.get(key)
+        if value is not None:
+            return value
+
+        redis_key = f"{self.name}:{version}:{key}"
+        try:
+            value = await cache.get(redis_key)
+        except Exception:
+            value = None
+
+        if value is None:
+            value = await loader()
+            try:
+                await cache.set(redis_key, value, ex=self.ttl)
+            except Exception as e:
+                logger.warning(f"set {redis_key} failed: {e}")
+        elif isinstance(value, str):
+            value = value.encode()
 
+        # the version may have been bumped while loading
+        if self._local_version == version:
+            self._local[key] = value
+        return value
 
-cache = get_cache()
+    async def invalidate(self) -> int:
+        self._local.clear()
+        return await self.version.bump()
 
-cache_config = {
-    "default": {
-        "cache": "aiocache.RedisCache",
-        "endpoint": "localhost",
-        "port": 6379,
-        "serializer": {
-            "class": PickleSerializer
+
+class LocalCache:
+    """
+    Bounded per-process LRU with a TTL per entry.
+    """
+
+    def __init__(self, maxsize: int = None, ttl: float = None):
+        self.maxsize = settings.LOCAL_CACHE_MAXSIZE if maxsize is None else maxsize
+        self.ttl = settings.LOCAL_CACHE_TTL if ttl is None else ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: str, value: Any, ttl: float = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
         }
-    }
-}
 
-caches.set_config(cache_config)
 
+def _raw(value):
+    return value
+
+
+def _pack(payload: bytes, deadline: Optional[float], delta: Optional[float]) -> bytes:
+    """
+    L2 entry: "<deadline> <load duration> <payload>", so a hit knows when the
+    entry expires and how long it took to load without another round trip.
+    """
+    return b"%.3f %.6f " % (deadline or 0, delta or 0) + payload
+
+
+def _unpack(value) -> Optional[tuple]:
+    """(payload, deadline or None, load duration or None) of an L2 entry, None if malformed."""
+    try:
+        deadline, delta, payload = value.split(" ", 2)
+        return payload, float(deadline) or None, float(delta) or None
+    except (AttributeError, ValueError):
+        return None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one in-flight load.
+    The load runs as its own task, so a cancelled caller doesn't cancel it
+    for the others.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        self._calls.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every caller went away
+
+    async def do(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(loader())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+
+class TieredCache:
+    """
+    L1 LocalCache in front of the redis model_cache (L2).
+    Both tiers hold the serialized payload, so callers never share instances.
+    Deletes are published on redis so every worker drops its L1 copy.
+    """
+    CHANNEL = "cache:invalidate"
+
+    def __init__(self, l2, l1: LocalCache = None):
+        self.l2 = l2
+        self.l1 = l1 or LocalCache()
+        self.flight = SingleFlight()
+        # prefixes the published keys, so the listener skips the echo of our own deletes
+        self.origin = uuid.uuid4().hex
+        # key -> [loads in flight, deletes seen], only while the key is being loaded,
+        # so a load racing with a delete of its key never puts the old value back
+        self._loads: dict[str, list[int]] = {}
+        # early refreshes run in the background, keep them referenced until done
+        self._refreshes: set[asyncio.Task] = set()
+
+    @property
+    def serializer(self):
+        return self.l2.serializer
+
+    async def _get_l2(self, key: str) -> Optional[tuple]:
+        # entries written before the deadline was stored are treated as misses
+        value = await self.l2.get(key, loads_fn=_raw)
+        return None if value is None else _unpack(value)
+
+    async def _get_entry(self, key: str) -> Optional[tuple]:
+        """
+        (payload, deadline of the L2 entry or None, load duration or None)
+        """
+        entry = self.l1.get(key)
+        if entry is None:
+            entry = await self._get_l2(key)
+            if entry is not None:
+                self.l1.set(key, entry)
+        return entry
+
+    async def get(self, key: str) -> Any:
+        entry = await self._get_entry(key)
+        return None if entry is None else self.serializer.loads(entry[0])
+
+    async def set(self, key: str, value: Any, ttl: int = None, delta: float = None) -> None:
+        payload = self.serializer.dumps(value)
+        deadline = None if ttl is None else time.time() + ttl
+        self.l1.set(key, (payload, deadline, delta), ttl)
+        await self.l2.set(key, _pack(payload, deadline, delta), ttl=ttl, dumps_fn=_raw)
+
+    async def get_or_load(self,
+                          key: str,
+                          loader: Callable[[], Awaitable[Any]],
+                          ttl: int = None,
+                          lock: bool = False,
+                          early_refresh: bool = False,
+                          beta: float = 1.0) -> Any:
+        """
+        Read through both tiers and load on a miss.
+        Concurrent misses in a worker share one load. With lock=True a redis
+        lock lets a single worker load while the others wait for its result.
+        With early_refresh=True a hit may trigger a background reload before
+        the L2 entry expires, with a probability growing near expiry (XFetch).
+        """
+        entry = await self._get_entry(key)
+        if entry is not None:
+            payload, deadline, delta = entry
+            if early_refresh and deadline is not None:
+                delta = delta or settings.CACHE_EARLY_REFRESH_DELTA
+                if time.time() - delta * beta * math.log(random.random()) >= deadline:
+                    task = asyncio.ensure_future(self.flight.do(
+                        key, lambda: self._load(key, loader, ttl, lock)))
+                    self._refreshes.add(task)
+                    task.add_done_callback(lambda t: self._refreshed(key, t))
+            return self.serializer.loads(payload)
+
+        return await self.flight.do(key, lambda: self._load(key, loader, ttl, lock))
+
+    def _refreshed(self, key: str, task: asyncio.Task) -> None:
+        self._refreshes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            # the stale entry keeps being served, the next hit retries
+            logger.warning(f"early refresh of {key} failed: {task.exception()}")
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: int, lock: bool) -> Any:
+        if not lock:
+            return await self._load_and_set(key, loader, ttl)
+
+        redis_lock = cache.lock(f"lock:{key}", timeout=settings.CACHE_LOCK_TIMEOUT)
+        try:
+            acquired = await redis_lock.acquire(blocking=False)
+        except Exception as e:
+            logger.warning(f"lock {key} failed: {e}")
+            return await self._load_and_set(key, loader, ttl)
+
+        if acquired:
+            try:
+                return await self._load_and_set(key, loader, ttl)
+            finally:
+                try:
+                    await redis_lock.release()
+                except Exception:
+                    ...  # expired, the next loader takes over
+
+        # another worker is loading, wait for its result
+        waited = 0.0
+        while waited < settings.CACHE_LOCK_TIMEOUT:
+            await asyncio.sleep(0.05)
+            waited += 0.05
+            entry = await self._get_l2(key)
+            if entry is not None:
+                self.l1.set(key, entry)
+                return self.serializer.loads(entry[0])
+        return await self._load_and_set(key, loader, ttl)
+
+    async def _load_and_set(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: int) -> Any:
+        state = self._loads.setdefault(key, [0, 0])
+        state[0] += 1
+        deletes = state[1]
+        try:
+            started = time.perf_counter()
+            value = await loader()
+            if value is not None and state[1] == deletes:
+                await self.set(key, value, ttl, delta=time.perf_counter() - started)
+        finally:
+            state[0] -= 1
+            if not state[0]:
+                del self._loads[key]
+        return value
+
+    def _drop_local(self, key: str) -> None:
+        state = self._loads.get(key)
+        if state is not None:
+            state[1] += 1
+        self.l1.delete(key)
+
+    async def delete(self, key: str) -> None:
+        self._drop_local(key)
+        await self.l2.delete(key)
+        try:
+            await cache.publish(self.CHANNEL, f"{self.origin} {key}")
+        except Exception as e:
+            logger.warning(f"publish invalidation of {key} failed: {e}")
+
+    async def delete_many(self, keys: Iterable[str]) -> None:
+        """delete for several keys, in one L2 call and one pipelined publish."""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return
+        for key in keys:
+            self._drop_local(key)
+        await self.l2.delete(*keys)
+        try:
+            async with cache.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.publish(self.CHANNEL, f"{self.origin} {key}")
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"publish invalidation of {len(keys)} keys failed: {e}")
+
+    async def listen(self) -> None:
+        """
+        Drop L1 entries deleted by other workers, reconnecting on errors.
+        """
+        while True:
+            try:
+                async with cache.pubsub() as pubsub:
+                    await pubsub.subscribe(self.CHANNEL)
+                    # anything may have changed while we were not listening
+                    self.l1.clear()
+                    while True:
+                        # short timeout keeps reads under the socket timeout
+                        message = await pubsub.get_message(
+                            ignore_subscribe_messages=True, timeout=1.0)
+                        if message is not None:
+                            origin, _, key = message["data"].partition(" ")
+                            if origin != self.origin:
+                                self._drop_local(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"cache invalidation listener failed: {e}")
+                self.l1.clear()
+                await asyncio.sleep(1)
+
+
+tiered_cache = TieredCache(model_cache)
+
+_listener_task: Optional[asyncio.Task] = None
+
+
+async def start_cache_listener() -> None:
+    global _listener_task
+    if _listener_task is None:
+        _listener_task = asyncio.create_task(tiered_cache.listen())
+
+
+async def stop_cache_listener() -> None:
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
+
+
+def cached(key: Callable[..., str], ttl: int = None, **options):
+    """
+    Decorator caching an async function through tiered_cache,
+    see TieredCache.get_or_load for the options.
 
-model_cache = caches.get("default")
+        @cached(lambda user_id: f"user:{user_id}", ttl=600, lock=True)
+        async def load_user(user_id): ...
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await tiered_cache.get_or_load(
+                key(*args, **kwargs), lambda: func(*args, **kwargs), ttl, **options)
+        return wrapper
+    return decorator
@@ -1,9 +1,10 @@
 import os
 import sys
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
-from typing import Any, List
+from typing import Any, List, Optional
 from pydantic import EmailStr
 from pydantic_settings import BaseSettings
 
@@ -28,6 +29,7 @@ class Settings(BaseSettings):
         'app.applications.users',
         'app.applications.groups',
         'app.applications.system',
+        'app.applications.diagnostics',
     ]
 
     PROJECT_ROOT: str = _PROJECT_ROOT
@@ -37,8 +39,22 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.environ.get("SECRET_KEY")
     JWT_ALGORITHM: str = 'HS25'
     JWT_EXPIRE: int = 60 * 60 * 24 * 7  # 7 day
-
-    REDIS_URL: str = ''
+    # carry is_active/is_superuser/roles in the access token and
+    # authorize from the claims without loading the user
+    JWT_STATELESS: bool = False
+
+    REDIS_URL: str = 'redis://localhost:6379'
+    REDIS_MAX_CONNECTIONS: int = 50
+    # seconds to wait for a free connection when the pool is exhausted
+    REDIS_POOL_TIMEOUT: float = 5
+    REDIS_SOCKET_TIMEOUT: float = 5
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 5
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    CACHE_VERSION_CHECK_INTERVAL: float = 1.0
+    LOCAL_CACHE_MAXSIZE: int = 10000
+    LOCAL_CACHE_TTL: float = 60
+    CACHE_LOCK_TIMEOUT: float = 5
+    CACHE_EARLY_REFRESH_DELTA: float = 0.05
 
     CORS_ORIGINS: List[str] = [
         "http://localhost",
@@ -52,6 +68,36 @@ class Settings(BaseSettings):
 
     CAPTCHA_FONT_PATH: str = os.path.join(
         BASE_DIR, "app/templates/RubikWetPaint-Regular.ttf")
+    # last_login is written behind, at most every interval or once this many users are pending
+    LAST_LOGIN_FLUSH_INTERVAL: float = 5.0
+    LAST_LOGIN_BUFFER_SIZE: int = 1000
+    # seconds a login identifier that matched no user is answered from redis
+    AUTH_UNKNOWN_IDENTIFIER_TTL: int = 30
+    # list totals are cached, so they may lag behind by this many seconds
+    PAGINATION_TOTAL_TTL: int = 30
+
+    METRICS_ENABLED: bool = True
+    # /metrics is only served with this bearer token set, the collectors run either way
+    METRICS_TOKEN: Optional[str] = os.environ.get("METRICS_TOKEN")
+    # seconds, 0 disables the slow request log
+    SLOW_REQUEST_THRESHOLD: float = 1.0
+    # same-shape queries per request before it is reported as N+1, 0 disables the audit
+    QUERY_AUDIT_THRESHOLD: int = 5
+    PROFILER_MAX_SECONDS: float = 60
+    PROFILER_MIN_INTERVAL: float = 0.001
+    # bulk user import, the spool dir must be shared by the web and celery workers
+    IMPORT_SPOOL_DIR: str = os.path.join(tempfile.gettempdir(), "fast-well-imports")
+    IMPORT_BATCH_SIZE: int = 1000
+    IMPORT_HASH_WORKERS: int = 4
+    # bcrypt hashes running at once, the rest queue on the event loop
+    PASSWORD_HASH_CONCURRENCY: int = 4
+    # pre-rendered captchas kept per worker, refilled below the low-water mark
+    CAPTCHA_POOL_SIZE: int = 500
+    CAPTCHA_POOL_LOW_WATER: int = 100
+    CAPTCHA_POOL_BATCH: int = 50
+    CAPTCHA_POOL_WORKERS: int = 1
+    # renders single captchas while the pool is drained
+    CAPTCHA_FALLBACK_WORKERS: int = 1
 
     SUPERUSER: EmailStr = "root@admin.com"
     SUPERUSER_PASSWORD: str = "123456"
@@ -66,6 +112,14 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: str = os.environ.get("SMTP_PASSWORD")
     EMAIL_RESET_TOKEN_EXPIRE_HOURS: int = 1
     EMAILS_ENABLED: bool = True
+    # outbox, see app.core.mail
+    EMAIL_BATCH_SIZE: int = 100
+    EMAIL_SMTP_POOL_SIZE: int = 2
+    EMAIL_SMTP_TIMEOUT: int = 10
+    EMAIL_SMTP_MAX_IDLE: int = 60
+    EMAIL_MAX_RETRIES: int = 5
+    EMAIL_RETRY_BACKOFF: int = 5
+    EMAIL_RETRY_BACKOFF_MAX: int = 600
     LOGIN_URL: str = SERVER_HOST + '/api/auth/login/access-token'
     EMAIL_TEMPLATES_DIR: str = os.path.join(
         BASE_DIR, "app/templates/emails/build/")
@@ -9,10 +9,13 @@ from tortoise.contrib.fastapi import register_tortoise
 from app.core.exceptions import APIException, on_api_exception
 from app.core.config import settings
 from app.core.log import DEFAULT_LOGGING
+from app.core.metrics import MetricsMiddleware, install_redis_hook, router as metrics_router
+from app.core.query_audit import QueryAuditMiddleware
 from app.core.auth.routes import router as auth_router
 from app.applications.users.routes import router as users_router
 from app.applications.system.routes import router as system_router
 from app.applications.groups.routes import router as groups_router
+from app.applications.diagnostics.routes import router as diagnostics_router
 
 
 def configure_logging(log_settings: dict = None):
@@ -32,6 +35,12 @@ def init_middlewares(app: FastAPI):
         allow_methods=settings.CORS_ALLOW_METHODS,
         allow_headers=settings.CORS_ALLOW_HEADERS,
     )
+    # added before MetricsMiddleware so it runs inside it, audited queries still reach the request stats
+    if settings.QUERY_AUDIT_THRESHOLD:
+        app.add_middleware(QueryAuditMiddleware)
+    if settings.METRICS_ENABLED:
+        install_redis_hook()
+        app.add_middleware(MetricsMiddleware)
 
 
 def _get_tortoise_config() -> dict:
@@ -70,4 +79,7 @@ def register_routers(app: FastAPI):
     app.include_router(users_router, prefix="/users")
     app.include_router(groups_router, prefix="/groups")
     app.include_router(system_router, prefix="/system")
+    app.include_router(diagnostics_router, prefix="/diagnostics")
+    if settings.METRICS_ENABLED and settings.METRICS_TOKEN:
+        app.include_router(metrics_router)
 
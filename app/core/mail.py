@@ -0,0 +1,190 @@
+"""
+Email outbox.
+
+The web workers only render messages and enqueue them in batches to celery,
+the celery workers deliver them over pooled SMTP connections
+and count the results in the MAIL_STATS_KEY redis hash.
+"""
+import logging
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from email.utils import formataddr, formatdate, make_msgid
+from typing import Iterable, Optional, TypedDict
+
+import redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MAIL_STATS_KEY = "mail:stats"
+# sent messages per minute, kept for an hour
+MAIL_SENT_PER_MINUTE_KEY = "mail:sent:{}"
+
+
+class OutboxMessage(TypedDict):
+    to: str
+    subject: str
+    html: str
+
+
+def build_message(message: OutboxMessage) -> EmailMessage:
+    email = EmailMessage()
+    email["Subject"] = message["subject"]
+    email["From"] = formataddr((settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL))
+    email["To"] = message["to"]
+    email["Date"] = formatdate(localtime=True)
+    email["Message-ID"] = make_msgid()
+    email.set_content(message["html"], subtype="html")
+    return email
+
+
+class SMTPPool:
+    """
+    Idle SMTP connections of the worker process, reused across tasks.
+    Connections idle for longer than max_idle are checked with NOOP before reuse.
+    """
+
+    def __init__(self,
+                 size: int = settings.EMAIL_SMTP_POOL_SIZE,
+                 max_idle: float = settings.EMAIL_SMTP_MAX_IDLE):
+        self.size = size
+        self.max_idle = max_idle
+        self._idle: list[tuple[smtplib.SMTP, float]] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def connect() -> smtplib.SMTP:
+        smtp_class = smtplib.SMTP_SSL if settings.SMTP_SSL else smtplib.SMTP
+        conn = smtp_class(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.EMAIL_SMTP_TIMEOUT)
+        if settings.SMTP_TLS:
+            conn.starttls()
+        if settings.SMTP_USER:
+            conn.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        return conn
+
+    def acquire(self) -> smtplib.SMTP:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, released_at = self._idle.pop()
+            if time.monotonic() - released_at < self.max_idle:
+                return conn
+            try:
+                if conn.noop()[0] == 250:
+                    return conn
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.discard(conn)
+        return self.connect()
+
+    def release(self, conn: smtplib.SMTP):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        self.discard(conn)
+
+    @staticmethod
+    def discard(conn: smtplib.SMTP):
+        try:
+            conn.quit()
+        except (smtplib.SMTPException, OSError):
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self.discard(conn)
+
+
+smtp_pool = SMTPPool()
+
+_stats_client: Optional[redis.Redis] = None
+
+
+def record_stats(sent: int = 0, failed: int = 0, retried: int = 0):
+    global _stats_client
+    if _stats_client is None:
+        _stats_client = redis.Redis.from_url(settings.REDIS_URL)
+    minute_key = MAIL_SENT_PER_MINUTE_KEY.format(int(time.time() // 60))
+    try:
+        pipe = _stats_client.pipeline(transaction=False)
+        pipe.hincrby(MAIL_STATS_KEY, "batches", 1)
+        pipe.hincrby(MAIL_STATS_KEY, "sent", sent)
+        pipe.hincrby(MAIL_STATS_KEY, "failed", failed)
+        pipe.hincrby(MAIL_STATS_KEY, "retried", retried)
+        pipe.incrby(minute_key, sent)
+        pipe.expire(minute_key, 3600)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"record mail stats failed: {e}")
+
+
+def deliver(messages: list[OutboxMessage]) -> tuple[int, int, list[OutboxMessage], Optional[Exception]]:
+    """
+    Send a batch over one pooled connection.
+    Returns (sent, failed, pending, error): messages rejected permanently count
+    as failed, on a connection or temporary (4xx) error the rest of the batch
+    is returned as pending, to be retried later.
+    """
+    sent = failed = 0
+    try:
+        conn = smtp_pool.acquire()
+    except (smtplib.SMTPException, OSError) as e:
+        return sent, failed, messages, e
+
+    for i, message in enumerate(messages):
+        try:
+            conn.send_message(build_message(message))
+            sent += 1
+        except smtplib.SMTPRecipientsRefused as e:
+            logger.warning(f"email to {message['to']} refused: {e.recipients}")
+            failed += 1
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code >= 500:
+                logger.warning(f"email to {message['to']} rejected: {e.smtp_code} {e.smtp_error}")
+                failed += 1
+                continue
+            smtp_pool.discard(conn)
+            return sent, failed, messages[i:], e
+        except (smtplib.SMTPException, OSError) as e:
+            smtp_pool.discard(conn)
+            return sent, failed, messages[i:], e
+    smtp_pool.release(conn)
+    return sent, failed, [], None
+
+
+def enqueue_emails(messages: Iterable[OutboxMessage]) -> int:
+    """
+    Queue messages for delivery in batches of EMAIL_BATCH_SIZE, returns the number of batches.
+    """
+    from app.core.tasks import send_emails
+
+    assert settings.EMAILS_ENABLED, "no provided configuration for email variables"
+    batches = 0
+    batch = []
+    for message in messages:
+        batch.append(message)
+        if len(batch) >= settings.EMAIL_BATCH_SIZE:
+            send_emails.delay(batch)
+            batches += 1
+            batch = []
+    if batch:
+        send_emails.delay(batch)
+        batches += 1
+    return batches
+
+
+async def get_mail_stats(client) -> dict:
+    """
+    Outbox counters plus the messages sent during the last minute, read with the async client.
+    """
+    stats = {k: int(v) for k, v in (await client.hgetall(MAIL_STATS_KEY)).items()}
+    last_minute = await client.get(MAIL_SENT_PER_MINUTE_KEY.format(int(time.time() // 60) - 1))
+    stats["sent_last_minute"] = int(last_minute or 0)
+    return stats
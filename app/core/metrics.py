@@ -0,0 +1,299 @@
+"""
+Request instrumentation.
+
+MetricsMiddleware times every HTTP request and files it under its route
+template, together with the Tortoise queries and redis commands issued
+while handling it. The totals are served in the Prometheus text format on
+/metrics, only when METRICS_TOKEN is set and only to scrapers sending it as
+bearer token. Requests slower than SLOW_REQUEST_THRESHOLD are logged with
+their query breakdown.
+
+Metrics are kept per worker process, scrape every worker or sum them upstream.
+"""
+import bisect
+import functools
+import hmac
+import logging
+import time
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from redis.asyncio.client import Pipeline, Redis
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from app.core.auth.utils.password import password_hasher
+from app.core.cache import cache, redis_pool, tiered_cache
+from app.core.config import settings
+from app.core.mail import get_mail_stats
+
+logger = logging.getLogger(__name__)
+
+# prometheus client defaults, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_METHODS = ("execute_query", "execute_query_dict", "execute_insert", "execute_many", "execute_script")
+UNMATCHED_ROUTE = "<unmatched>"
+# distinct statements tracked per request, the rest are only counted
+MAX_TRACKED_STATEMENTS = 100
+SLOW_LOG_STATEMENTS = 5
+
+
+class RequestStats:
+    """
+    Queries and redis commands of one request, collected by the client hooks.
+    """
+    __slots__ = ("queries", "query_time", "redis_calls", "redis_time", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.redis_calls = 0
+        self.redis_time = 0.0
+        # sql -> [count, seconds]
+        self.statements: dict[str, list] = {}
+
+    def add_query(self, sql: str, elapsed: float):
+        self.queries += 1
+        self.query_time += elapsed
+        statement = self.statements.get(sql)
+        if statement is None:
+            if len(self.statements) >= MAX_TRACKED_STATEMENTS:
+                return
+            statement = self.statements[sql] = [0, 0.0]
+        statement[0] += 1
+        statement[1] += elapsed
+
+    def add_redis(self, elapsed: float):
+        self.redis_calls += 1
+        self.redis_time += elapsed
+
+    def top_statements(self, n: int = SLOW_LOG_STATEMENTS) -> list[tuple[str, int, float]]:
+        ranked = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)
+        return [(sql, count, elapsed) for sql, (count, elapsed) in ranked[:n]]
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+# set while inside a hooked call, so nested client calls are counted once
+_in_query: ContextVar[bool] = ContextVar("in_query", default=False)
+
+
+def _timed(method: Callable, record: Callable[[RequestStats, tuple, float], None]) -> Callable:
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        stats = _request_stats.get()
+        if stats is None or _in_query.get():
+            return await method(self, *args, **kwargs)
+        token = _in_query.set(True)
+        start = time.perf_counter()
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            record(stats, args, time.perf_counter() - start)
+            _in_query.reset(token)
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def _record_query(stats: RequestStats, args: tuple, elapsed: float):
+    stats.add_query(args[0] if args else "", elapsed)
+
+
+def _record_redis(stats: RequestStats, args: tuple, elapsed: float):
+    stats.add_redis(elapsed)
+
+
+def _subclasses(cls: type) -> Iterable[type]:
+    yield cls
+    for subclass in cls.__subclasses__():
+        yield from _subclasses(subclass)
+
+
+def install_query_hook():
+    """
+    Time the execute_* methods of every Tortoise client class loaded so far.
+    Backends are imported by Tortoise.init, so call it after the ORM is up, it is idempotent.
+    """
+    for cls in _subclasses(BaseDBAsyncClient):
+        for name in QUERY_METHODS:
+            method = cls.__dict__.get(name)
+            if method is not None and not getattr(method, "__instrumented__", False):
+                setattr(cls, name, _timed(method, _record_query))
+
+
+def install_redis_hook():
+    """
+    Time redis commands of the asyncio clients, a pipeline counts as one call.
+    """
+    for cls, name in ((Redis, "execute_command"), (Pipeline, "execute")):
+        method = cls.__dict__[name]
+        if not getattr(method, "__instrumented__", False):
+            setattr(cls, name, _timed(method, _record_redis))
+
+
+class RouteMetrics:
+    __slots__ = ("responses", "buckets", "count", "duration", "queries", "query_time", "redis_calls", "redis_time")
+
+    def __init__(self, buckets: int):
+        # status -> count
+        self.responses: dict[int, int] = {}
+        self.buckets = [0] * buckets
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+        self.redis_calls = 0
+        self.redis_time = 0.0
+
+
+def _labels(**labels) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class Metrics:
+    """
+    Per route counters and latency histogram of this process.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.bounds = buckets
+        self.routes: dict[tuple[str, str], RouteMetrics] = {}
+
+    def observe(self, method: str, route: str, status: int, duration: float, stats: RequestStats):
+        metrics = self.routes.get((method, route))
+        if metrics is None:
+            metrics = self.routes[(method, route)] = RouteMetrics(len(self.bounds))
+        metrics.responses[status] = metrics.responses.get(status, 0) + 1
+        i = bisect.bisect_left(self.bounds, duration)
+        if i < len(self.bounds):
+            metrics.buckets[i] += 1
+        metrics.count += 1
+        metrics.duration += duration
+        metrics.queries += stats.queries
+        metrics.query_time += stats.query_time
+        metrics.redis_calls += stats.redis_calls
+        metrics.redis_time += stats.redis_time
+
+    def reset(self):
+        self.routes.clear()
+
+    def render(self) -> list[str]:
+        lines = [
+            "# HELP http_requests_total Requests by route template and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route), metrics in self.routes.items():
+            for status, count in metrics.responses.items():
+                lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+        lines += [
+            "# HELP http_request_duration_seconds Request latency by route template.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), metrics in self.routes.items():
+            cumulative = 0
+            for bound, count in zip(self.bounds, metrics.buckets):
+                cumulative += count
+                lines.append(f"http_request_duration_seconds_bucket"
+                             f"{_labels(method=method, route=route, le=bound)} {cumulative}")
+            lines.append(f"http_request_duration_seconds_bucket"
+                         f"{_labels(method=method, route=route, le='+Inf')} {metrics.count}")
+            lines.append(f"http_request_duration_seconds_sum{_labels(method=method, route=route)} {metrics.duration}")
+            lines.append(f"http_request_duration_seconds_count{_labels(method=method, route=route)} {metrics.count}")
+
+        for name, attr, kind, doc in (
+                ("db_queries_total", "queries", "counter", "Tortoise queries by route template."),
+                ("db_query_duration_seconds_total", "query_time", "counter", "Time spent in Tortoise queries."),
+                ("redis_commands_total", "redis_calls", "counter", "Redis commands by route template."),
+                ("redis_command_duration_seconds_total", "redis_time", "counter", "Time spent in redis commands.")):
+            lines += [f"# HELP {name} {doc}", f"# TYPE {name} {kind}"]
+            for (method, route), metrics in self.routes.items():
+                lines.append(f"{name}{_labels(method=method, route=route)} {getattr(metrics, attr)}")
+        return lines
+
+
+metrics = Metrics()
+
+
+def _gauges(prefix: str, stats: dict, doc: str) -> list[str]:
+    lines = []
+    for key, value in stats.items():
+        name = f"{prefix}_{key}"
+        lines += [f"# HELP {name} {doc}", f"# TYPE {name} gauge", f"{name} {value}"]
+    return lines
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware, so the response body is streamed through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, registry: Metrics = metrics, slow_threshold: Optional[float] = None):
+        self.app = app
+        self.registry = registry
+        self.slow_threshold = settings.SLOW_REQUEST_THRESHOLD if slow_threshold is None else slow_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            _request_stats.reset(token)
+            # the router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            self.registry.observe(scope["method"], route, status, duration, stats)
+            if self.slow_threshold and duration >= self.slow_threshold:
+                log_slow_request(scope["method"], scope["path"], status, duration, stats)
+
+
+def log_slow_request(method: str, path: str, status: int, duration: float, stats: RequestStats):
+    breakdown = "".join(f"\n    {count}x {elapsed * 1000:.1f}ms {sql[:200]}"
+                        for sql, count, elapsed in stats.top_statements())
+    logger.warning(f"slow request {method} {path} {status} {duration * 1000:.1f}ms, "
+                   f"{stats.queries} queries {stats.query_time * 1000:.1f}ms, "
+                   f"{stats.redis_calls} redis calls {stats.redis_time * 1000:.1f}ms{breakdown}")
+
+
+router = APIRouter(tags=['metrics'])
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+async def metrics_token_required(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)):
+    if not settings.METRICS_TOKEN or credentials is None \
+            or not hmac.compare_digest(credentials.credentials.encode(), settings.METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+@router.get("/metrics", include_in_schema=False, dependencies=[Depends(metrics_token_required)])
+async def metrics_endpoint():
+    lines = metrics.render()
+    lines += _gauges("redis_pool", redis_pool.stats(), "Shared redis connection pool.")
+    lines += _gauges("local_cache", tiered_cache.l1.stats(), "Per worker L1 cache.")
+    lines += _gauges("password_hasher", password_hasher.stats(), "Password hashing executor.")
+    try:
+        lines += _gauges("mail", await get_mail_stats(cache), "Email outbox counters, shared by all workers.")
+    except Exception as e:
+        logger.warning(f"read mail stats failed: {e}")
+    return Response("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8")
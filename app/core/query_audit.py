@@ -0,0 +1,153 @@
+"""
+N+1 query detection.
+
+QueryAudit counts the queries run in its context by statement shape, the
+SQL with literals, placeholders and IN/VALUES lists folded, so a loop doing
+one query per row shows up as one shape with a large count:
+
+    with QueryAudit(threshold=5) as audit:
+        await Menu.full_hierarchy_menu()
+    audit.assert_no_repeats()
+
+It reuses the Tortoise query hook of app.core.metrics, install_query_hook
+must have run after Tortoise.init. QueryAuditMiddleware audits every
+request in DEBUG and while record_requests is active, see the query_audit
+pytest fixture in tests/conftest.py.
+"""
+import functools
+import logging
+import re
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.metrics import RequestStats, UNMATCHED_ROUTE, _request_stats
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r"\$\d+|%s|:\w+")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_ROWS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+_SPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(sql: str) -> str:
+    """
+    Shape of a statement: literals and placeholders become ?, IN lists and
+    multi-row VALUES collapse to (...), so it doesn't depend on the row.
+    """
+    shape = _STRING.sub("?", sql)
+    shape = _PLACEHOLDER.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    shape = _IN_LIST.sub("IN (...)", shape)
+    shape = _ROWS.sub("(...)", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+class RepeatedQueryError(AssertionError):
+    pass
+
+
+class QueryAudit(RequestStats):
+    """
+    Queries of its context grouped by fingerprint, shapes run more than
+    threshold times are reported as repeated. Queries are still counted in
+    the enclosing request stats or audit.
+    """
+    __slots__ = ("threshold", "shapes", "parent", "_token")
+
+    def __init__(self, threshold: Optional[int] = None):
+        super().__init__()
+        self.threshold = settings.QUERY_AUDIT_THRESHOLD if threshold is None else threshold
+        # fingerprint -> [count, first statement]
+        self.shapes: dict[str, list] = {}
+        self.parent: Optional[RequestStats] = None
+        self._token = None
+
+    def __enter__(self) -> "QueryAudit":
+        self.parent = _request_stats.get()
+        self._token = _request_stats.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _request_stats.reset(self._token)
+
+    def add_query(self, sql: str, elapsed: float):
+        super().add_query(sql, elapsed)
+        if self.parent is not None:
+            self.parent.add_query(sql, elapsed)
+        key = fingerprint(sql)
+        shape = self.shapes.get(key)
+        if shape is None:
+            self.shapes[key] = [1, sql]
+        else:
+            shape[0] += 1
+
+    def add_redis(self, elapsed: float):
+        super().add_redis(elapsed)
+        if self.parent is not None:
+            self.parent.add_redis(elapsed)
+
+    @property
+    def repeated(self) -> list[tuple[str, int, str]]:
+        """(fingerprint, count, first statement) of the shapes over the threshold, most repeated first."""
+        repeated = [(shape, count, sql) for shape, (count, sql) in self.shapes.items() if count > self.threshold]
+        return sorted(repeated, key=lambda item: item[1], reverse=True)
+
+    def report(self) -> str:
+        lines = [f"{self.queries} queries, {len(self.shapes)} shapes"]
+        lines += [f"    {count}x {shape[:300]}" for shape, count, _ in self.repeated]
+        return "\n".join(lines)
+
+    def assert_no_repeats(self, where: str = ""):
+        if self.repeated:
+            raise RepeatedQueryError(f"repeated queries (threshold {self.threshold}){' in ' + where if where else ''}: "
+                                     f"{self.report()}")
+
+
+# request audits are appended here while record_requests is active
+_recorders: list[list] = []
+
+
+@contextmanager
+def record_requests() -> Iterator[list[tuple[str, str, QueryAudit]]]:
+    """
+    Collect (method, route, audit) of the requests handled meanwhile,
+    they run on the server's own event loop, out of reach of a QueryAudit context.
+    """
+    recorded = []
+    _recorders.append(recorded)
+    try:
+        yield recorded
+    finally:
+        _recorders.remove(recorded)
+
+
+class QueryAuditMiddleware:
+    """
+    Audits the queries of each request in DEBUG or while requests are recorded,
+    repeated shapes are logged as possible N+1 queries.
+    """
+
+    def __init__(self, app: ASGIApp, threshold: Optional[int] = None):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not (settings.DEBUG or _recorders):
+            await self.app(scope, receive, send)
+            return
+
+        with QueryAudit(self.threshold) as audit:
+            await self.app(scope, receive, send)
+
+        route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+        if audit.repeated:
+            logger.warning(f"possible N+1 queries in {scope['method']} {route}: {audit.report()}")
+        for recorded in _recorders:
+            recorded.append((scope["method"], route, audit))
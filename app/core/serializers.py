@@ -0,0 +1,172 @@
+import logging
+import zlib
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Optional
+from uuid import UUID
+
+import orjson
+from aiocache.serializers import BaseSerializer
+from tortoise import Tortoise, fields
+from tortoise.fields.relational import ReverseRelation
+from tortoise.models import Model
+
+logger = logging.getLogger(__name__)
+
+MODEL_TAG = "__model__"
+
+
+class ModelLayout:
+    """
+    Column order and value converters of a model, computed once per class.
+    The tag embeds a checksum of the columns, so entries written with another
+    version of the model are rejected instead of loaded into the wrong fields.
+    """
+
+    def __init__(self, model: type[Model]):
+        meta = model._meta
+        self.model = model
+        self.columns = [(field, column, self._converter(meta.fields_map[field]))
+                        for field, column in meta.fields_db_projection.items()]
+        checksum = zlib.crc32(",".join(c for _, c, _ in self.columns).encode())
+        self.tag = f"{meta.app}.{model.__name__}:{checksum:x}"
+        self.custom_generated_pk = meta.db_pk_column not in meta.generated_db_fields
+
+    @staticmethod
+    def _converter(field: fields.Field) -> Optional[Callable[[Any], Any]]:
+        if isinstance(field, fields.DatetimeField):
+            return datetime.fromisoformat
+        if isinstance(field, fields.DateField):
+            return date.fromisoformat
+        if isinstance(field, fields.TimeField):
+            return time.fromisoformat
+        if isinstance(field, fields.UUIDField):
+            return UUID
+        if isinstance(field, fields.DecimalField):
+            return Decimal
+        if isinstance(field, fields.TimeDeltaField):
+            return field.to_python_value
+        if getattr(field, "enum_type", None) is not None:
+            return field.enum_type
+        return None
+
+    def dump(self, instance: Model) -> list:
+        return [getattr(instance, field) for field, _, _ in self.columns]
+
+    def load(self, values: list) -> Model:
+        if len(values) != len(self.columns):
+            raise ValueError(f"{self.tag} expects {len(self.columns)} columns")
+
+        instance = self.model.__new__(self.model)
+        instance._partial = False
+        instance._saved_in_db = True
+        instance._custom_generated_pk = self.custom_generated_pk
+        for (field, _, converter), value in zip(self.columns, values):
+            if converter is not None and value is not None:
+                value = converter(value)
+            setattr(instance, field, value)
+        return instance
+
+
+_layouts: dict[type, ModelLayout] = {}
+_layouts_by_tag: dict[str, ModelLayout] = {}
+
+
+def get_layout(model: type[Model]) -> ModelLayout:
+    layout = _layouts.get(model)
+    if layout is None:
+        layout = _layouts[model] = ModelLayout(model)
+        _layouts_by_tag[layout.tag] = layout
+    return layout
+
+
+def get_layout_by_tag(tag: str) -> ModelLayout:
+    layout = _layouts_by_tag.get(tag)
+    if layout is None:
+        app, name = tag.split(":", 1)[0].split(".", 1)
+        layout = get_layout(Tortoise.apps[app][name])
+        if layout.tag != tag:
+            raise ValueError(f"model layout changed, {tag} != {layout.tag}")
+    return layout
+
+
+def dump_model(instance: Model) -> dict:
+    """
+    The db columns of a model instance as a list,
+    plus the relations that were already fetched/prefetched.
+    """
+    layout = get_layout(instance.__class__)
+    data = {MODEL_TAG: layout.tag, "v": layout.dump(instance)}
+
+    related = {}
+    for name in instance._meta.fetch_fields:
+        value = instance.__dict__.get(f"_{name}")
+        if isinstance(value, ReverseRelation) and value._fetched:
+            related[name] = [dump_model(obj) for obj in value.related_objects]
+        elif isinstance(value, Model):
+            related[name] = dump_model(value)
+    if related:
+        data["r"] = related
+    return data
+
+
+def load_model(data: dict) -> Model:
+    """
+    Rehydrate an instance saved by dump_model without touching the database.
+    """
+    instance = get_layout_by_tag(data[MODEL_TAG]).load(data["v"])
+
+    for name, value in data.get("r", {}).items():
+        if isinstance(value, list):
+            relation = getattr(instance, name)
+            relation.related_objects = [load_model(obj) for obj in value]
+            relation._fetched = True
+        else:
+            setattr(instance, f"_{name}", load_model(value))
+    return instance
+
+
+def _default(value: Any):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, timedelta):
+        return value // timedelta(microseconds=1)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, Model):
+        return dump_model(value)
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict) and MODEL_TAG in value:
+        return load_model(value)
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+class ModelSerializer(BaseSerializer):
+    """
+    orjson serializer aware of Tortoise models.
+    Only the db columns and prefetched relations are stored, so entries stay
+    small and survive deploys, unlike pickled instances.
+    """
+    DEFAULT_ENCODING = None
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(_encode(value), default=_default)
+
+    def loads(self, value: Optional[bytes]) -> Any:
+        if value is None:
+            return None
+        try:
+            return _decode(orjson.loads(value))
+        except (KeyError, ValueError) as e:
+            # e.g. an entry written by an older release, treat it as a miss
+            logger.warning(f"ModelSerializer could not load cached value: {e}")
+            return None
@@ -1,6 +1,10 @@
+import asyncio
+import random
 from time import sleep
 from celery import current_task
 from app.core.celery import celery_app
+from app.core.config import settings
+from app.core.mail import deliver, record_stats
 
 
 @celery_app.task(acks_late=True)
@@ -10,3 +14,31 @@ def test_data_celery(word: str) -> str:
         current_task.update_state(state='PROGRESS',
                                   meta={'process_percent': i*10})
     return f"test task return {word}"
+
+
+@celery_app.task(bind=True, acks_late=True, max_retries=settings.EMAIL_MAX_RETRIES)
+def send_emails(self, messages: list[dict]) -> dict:
+    """
+    Deliver a batch of outbox messages, the undelivered rest of the batch
+    is retried with exponential backoff and jitter.
+    """
+    sent, failed, pending, error = deliver(messages)
+    record_stats(sent=sent, failed=failed, retried=len(pending))
+    if pending:
+        backoff = min(settings.EMAIL_RETRY_BACKOFF * 2 ** self.request.retries,
+                      settings.EMAIL_RETRY_BACKOFF_MAX)
+        raise self.retry(args=(pending,), exc=error, countdown=random.uniform(backoff / 2, backoff))
+    return {"sent": sent, "failed": failed}
+
+
+@celery_app.task(bind=True, acks_late=True)
+def import_users(self, path: str, fmt: str, notify: bool = False) -> dict:
+    """
+    Bulk import a spooled users upload, progress is reported as the PROGRESS state.
+    """
+    from app.applications.users.importer import run_import
+
+    def progress(meta: dict):
+        self.update_state(state="PROGRESS", meta=meta)
+
+    return asyncio.run(run_import(path, fmt, notify=notify, progress=progress))
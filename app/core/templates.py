@@ -0,0 +1,40 @@
+import logging
+from typing import Any
+
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateRegistry:
+    """
+    Shared jinja environment for the email templates.
+    Templates are compiled once and kept in the environment cache,
+    in DEBUG they are recompiled when the file changes.
+    """
+
+    def __init__(self, directory: str, auto_reload: bool = False):
+        self.env = Environment(
+            loader=FileSystemLoader(directory),
+            autoescape=select_autoescape(["html"]),
+            auto_reload=auto_reload,
+            cache_size=-1,
+        )
+
+    def preload(self) -> int:
+        names = self.env.list_templates()
+        for name in names:
+            self.env.get_template(name)
+        logger.info(f"loaded {len(names)} email templates")
+        return len(names)
+
+    def get(self, name: str) -> Template:
+        return self.env.get_template(name)
+
+    def render(self, name: str, **context: Any) -> str:
+        return self.env.get_template(name).render(**context)
+
+
+email_templates = TemplateRegistry(settings.EMAIL_TEMPLATES_DIR, auto_reload=settings.DEBUG)
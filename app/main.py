@@ -1,9 +1,15 @@
 from fastapi import FastAPI
 from fastapi_limiter import FastAPILimiter
+from app.core.base.responses import FastJSONResponse
 from app.core.exceptions import SettingNotFound
 from app.core.init_app import (configure_logging, init_middlewares, register_db,
                                register_exceptions, register_routers)
-from app.core.cache import get_cache
+from app.applications.users.utils import last_login_buffer
+from app.core.auth.utils.captcha import captcha_pool
+from app.core.auth.utils.password import password_hasher
+from app.core.templates import email_templates
+from app.core.metrics import install_query_hook
+from app.core.cache import get_cache, init_redis, close_redis, start_cache_listener, stop_cache_listener
 
 try:
     from app.core.config import settings
@@ -14,7 +20,9 @@ except ImportError as exc:
 app = FastAPI(
     title=settings.APP_TITLE,
     description=settings.APP_DESCRIPTION,
-    version=settings.VERSION
+    version=settings.VERSION,
+    # included routers inherit it for routes without their own response_class
+    default_response_class=FastJSONResponse,
 )
 
 configure_logging()
@@ -26,4 +34,24 @@ register_routers(app)
 
 @app.on_event("startup")
 async def startup():
+    if settings.METRICS_ENABLED or settings.QUERY_AUDIT_THRESHOLD:
+        # the Tortoise backends are loaded by now
+        install_query_hook()
+    await init_redis()
     await FastAPILimiter.init(get_cache())
+    await start_cache_listener()
+    await captcha_pool.start()
+    email_templates.preload()
+    await last_login_buffer.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await captcha_pool.stop()
+    await stop_cache_listener()
+    await close_redis()
+    password_hasher.shutdown()
+
+
+# flush pending last_login updates before Tortoise closes its connections
+app.router.on_shutdown.insert(0, last_login_buffer.stop)
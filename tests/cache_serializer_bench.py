@@ -0,0 +1,46 @@
+#! /usr/bin/env python3
+"""
+Size and latency of PickleSerializer vs ModelSerializer for a cached user.
+
+PYTHONPATH="./" python tests/cache_serializer_bench.py
+"""
+import timeit
+
+from aiocache.serializers import PickleSerializer
+from tortoise import Tortoise, run_async
+
+from app.core.init_app import TORTOISE_ORM
+from app.core.serializers import ModelSerializer
+from app.applications.users.models import User
+from app.applications.groups.models import Group
+from app.applications.system.models import Role
+
+ROUNDS = 10000
+
+
+async def main():
+    config = {**TORTOISE_ORM, "connections": {"default": "sqlite://:memory:"}}
+    await Tortoise.init(config=config)
+    await Tortoise.generate_schemas()
+
+    user = User(username="bench", email="bench@example.com",
+                first_name="Bench", last_name="Mark",
+                password_hash="$2b$12$" + "x" * 53)
+    await user.save()
+    for i in range(5):
+        group = await Group.create(name=f"group-{i}", description="bench group")
+        await group.users.add(user)
+        role = await Role.create(name=f"role-{i}", key=f"ROLE_{i}")
+        await role.users.add(user)
+    user = await User.get(id=user.id).prefetch_related("groups", "roles")
+
+    for serializer in (PickleSerializer(), ModelSerializer()):
+        payload = serializer.dumps(user)
+        dumps = timeit.timeit(lambda: serializer.dumps(user), number=ROUNDS)
+        loads = timeit.timeit(lambda: serializer.loads(payload), number=ROUNDS)
+        print(f"{serializer.__class__.__name__:<18} size={len(payload):<6} "
+              f"dumps={dumps / ROUNDS * 1e6:.1f}us loads={loads / ROUNDS * 1e6:.1f}us")
+
+
+if __name__ == "__main__":
+    run_async(main())
@@ -0,0 +1,64 @@
+"""
+pytest fixtures.
+
+    def test_menus(client, run, query_audit):
+        client.get("/system/menus", headers=headers)
+
+client is the app on an in-memory sqlite database, run(coro) awaits a
+coroutine on the app's event loop. The app needs redis at REDIS_URL,
+without it the tests using client are skipped.
+
+query_audit fails the test when a statement shape runs more than
+QUERY_AUDIT_THRESHOLD times, in code awaited by the test itself or in any
+request it makes through the app.
+"""
+import os
+
+# required by the settings, no mail is sent by the tests
+for name, value in (("SECRET_KEY", "test"),
+                    ("SMTP_HOST", "localhost"),
+                    ("SMTP_PORT", "25"),
+                    ("SMTP_USER", ""),
+                    ("SMTP_PASSWORD", ""),
+                    ("EMAILS_FROM_NAME", "test"),
+                    ("EMAILS_FROM_EMAIL", "test@example.com")):
+    os.environ.setdefault(name, value)
+
+import pytest
+import redis
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+settings.DB_CONNECTIONS = {"default": "sqlite://:memory:"}
+
+from app.core.query_audit import QueryAudit, record_requests  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    try:
+        with redis.Redis.from_url(settings.REDIS_URL) as r:
+            r.ping()
+    except redis.RedisError as e:
+        pytest.skip(f"redis unavailable at {settings.REDIS_URL}: {e}")
+
+    from app.main import app
+
+    # startup initialises Tortoise, creates the schema and installs the query hook
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def run(client):
+    return lambda coro: client.portal.call(lambda: coro)
+
+
+@pytest.fixture
+def query_audit(client):
+    with QueryAudit() as audit, record_requests() as requests:
+        yield audit
+    audit.assert_no_repeats()
+    for method, route, request_audit in requests:
+        request_audit.assert_no_repeats(f"{method} {route}")
@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+"""
+req/s of the list endpoints with FastAPI's default pipeline
+(dict -> response_model validation -> JSONResponse) vs FastJSONResponse(ResponseData).
+
+PYTHONPATH="./" python tests/json_response_bench.py 2000
+"""
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+from tortoise import Tortoise, run_async
+
+from app.core.init_app import TORTOISE_ORM
+from app.core.base.pagination import Keyset, paginate
+from app.core.base.responses import FastJSONResponse
+from app.core.base.schemas import ResponseData
+from app.applications.users.models import User
+from app.applications.users.schemas import BaseUserOutList
+from app.applications.system.models import Menu
+from app.applications.system.schemas import MenuOut, MenuType
+
+PAGE_SIZE = 20
+
+app = FastAPI()
+
+
+@app.get("/legacy/users", response_model=ResponseData[BaseUserOutList])
+async def legacy_users():
+    return {"data": await paginate(User.all(), Keyset(User), PAGE_SIZE)}
+
+
+@app.get("/fast/users", response_model=ResponseData[BaseUserOutList])
+async def fast_users():
+    data = await paginate(User.all(), Keyset(User), PAGE_SIZE)
+    return FastJSONResponse(ResponseData[BaseUserOutList](data=data))
+
+
+@app.get("/legacy/menus", response_model=ResponseData[list[MenuOut]])
+async def legacy_menus():
+    return {"data": await Menu.full_hierarchy_menu()}
+
+
+@app.get("/fast/menus", response_model=ResponseData[list[MenuOut]])
+async def fast_menus():
+    return FastJSONResponse(ResponseData[list[MenuOut]](data=await Menu.full_hierarchy_menu()))
+
+
+async def seed():
+    await User.bulk_create([User(username=f"user{i}", email=f"user{i}@example.com", first_name="Bench",
+                                 last_name=f"User {i}", password_hash="x") for i in range(PAGE_SIZE)])
+    await Menu.bulk_create([Menu(id=i, name=f"menu-{i}", parent_id=(i - 1) // 5 or None, type=MenuType.MENU,
+                                 path=f"/menu/{i}", component=f"menu/{i}", sort=i) for i in range(1, 201)])
+
+
+async def measure(client: httpx.AsyncClient, path: str, requests: int) -> float:
+    size = len((await client.get(path)).content)
+    start = time.perf_counter()
+    for _ in range(requests):
+        await client.get(path)
+    rate = requests / (time.perf_counter() - start)
+    print(f"{path:<14} {rate:8.0f} req/s  {size} bytes")
+    return rate
+
+
+async def main(requests: int):
+    config = {**TORTOISE_ORM, "connections": {"default": "sqlite://:memory:"}}
+    await Tortoise.init(config=config)
+    await Tortoise.generate_schemas()
+    await seed()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name in ("users", "menus"):
+            legacy = await measure(client, f"/legacy/{name}", requests)
+            fast = await measure(client, f"/fast/{name}", requests)
+            print(f"{name}: x{fast / legacy:.2f}")
+
+
+if __name__ == "__main__":
+    run_async(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
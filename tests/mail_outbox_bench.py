@@ -0,0 +1,63 @@
+#! /usr/bin/env python3
+"""
+Deliver outbox batches to a local aiosmtpd server,
+one SMTP connection per message (like emails.Message.send) vs the pooled outbox.
+
+pipenv install --dev
+PYTHONPATH="./" python tests/mail_outbox_bench.py 2000
+"""
+import smtplib
+import sys
+import time
+
+from aiosmtpd.controller import Controller
+
+from app.core.config import settings
+from app.core.celery import celery_app
+from app.core.mail import SMTPPool, build_message, smtp_pool
+from app.core.tasks import send_emails
+
+PORT = 8025
+
+
+class Counter:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+
+def main(total: int):
+    settings.SMTP_HOST, settings.SMTP_PORT = "127.0.0.1", PORT
+    settings.SMTP_TLS = settings.SMTP_SSL = False
+    settings.SMTP_USER = None
+    celery_app.conf.task_always_eager = True
+
+    handler = Counter()
+    controller = Controller(handler, hostname="127.0.0.1", port=PORT)
+    controller.start()
+    messages = [{"to": f"user{i}@example.com", "subject": f"bench {i}", "html": "<p>hello</p>"}
+                for i in range(total)]
+    try:
+        start = time.perf_counter()
+        for message in messages:
+            with SMTPPool.connect() as conn:
+                conn.send_message(build_message(message))
+        elapsed = time.perf_counter() - start
+        print(f"per message  sent={handler.received:<6} {total / elapsed:.0f} msg/s")
+
+        handler.received = 0
+        start = time.perf_counter()
+        for i in range(0, total, settings.EMAIL_BATCH_SIZE):
+            send_emails.delay(messages[i:i + settings.EMAIL_BATCH_SIZE]).get()
+        elapsed = time.perf_counter() - start
+        print(f"outbox       sent={handler.received:<6} {total / elapsed:.0f} msg/s")
+    finally:
+        smtp_pool.close()
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
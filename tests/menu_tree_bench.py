@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+"""
+Compare the recursive (one query per node) menu tree with the
+single query builder of Menu.full_hierarchy_menu.
+
+PYTHONPATH="./" python tests/menu_tree_bench.py 10000
+"""
+import random
+import sys
+import time
+
+from tortoise import Tortoise, connections, run_async
+
+from app.core.init_app import TORTOISE_ORM
+from app.applications.system.models import Menu
+from app.applications.system.schemas import MenuType, MenuOut
+
+
+class QueryCounter:
+    METHODS = ("execute_query", "execute_query_dict")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.count = 0
+
+    def __enter__(self):
+        for name in self.METHODS:
+            method = getattr(self.conn, name)
+
+            async def wrapper(*args, __method=method, **kwargs):
+                self.count += 1
+                return await __method(*args, **kwargs)
+            setattr(self.conn, name, wrapper)
+        return self
+
+    def __exit__(self, *exc):
+        for name in self.METHODS:
+            delattr(self.conn, name)
+
+
+async def recursive_menu(parent=None) -> list[MenuOut]:
+    result = []
+    root_menus = await Menu.filter(parent=parent, is_deleted=False).order_by("sort", "id").all()
+    for root in root_menus:
+        d = {field: getattr(root, field) for field in root._meta.db_fields}
+        d["parent_id"] = parent.id if parent else None
+        d["children"] = await recursive_menu(root)
+        result.append(MenuOut(**d))
+    return result
+
+
+async def seed(total: int):
+    menus = []
+    for i in range(1, total + 1):
+        parent_id = random.randint(1, i - 1) if i > 10 else None
+        menus.append(Menu(id=i, name=f"menu-{i}", parent_id=parent_id,
+                          type=MenuType.CATALOG, sort=random.randint(0, 10)))
+    await Menu.bulk_create(menus, batch_size=1000)
+
+
+async def measure(name, func):
+    with QueryCounter(connections.get("default")) as counter:
+        start = time.perf_counter()
+        tree = await func()
+        elapsed = time.perf_counter() - start
+    print(f"{name:<12} queries={counter.count:<8} time={elapsed * 1000:.1f}ms")
+    return tree
+
+
+async def main(total: int):
+    config = {**TORTOISE_ORM, "connections": {"default": "sqlite://:memory:"}}
+    await Tortoise.init(config=config)
+    await Tortoise.generate_schemas()
+    await seed(total)
+
+    old = await measure("recursive", recursive_menu)
+    new = await measure("single", Menu.full_hierarchy_menu)
+    assert old == new, "tree mismatch"
+
+
+if __name__ == "__main__":
+    run_async(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000))
@@ -0,0 +1,73 @@
+#! /usr/bin/env python3
+"""
+Latency of an unrelated endpoint during a login burst,
+with bcrypt on the event loop vs on the PasswordHasher pool.
+
+PYTHONPATH="./" python tests/password_bench.py 50
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.core.auth.utils.password import (get_password_hash, password_hasher,
+                                          verify_and_update_password)
+
+app = FastAPI()
+password_hash = get_password_hash("123456")
+
+
+@app.post("/login/sync")
+async def login_sync():
+    return verify_and_update_password("123456", password_hash)[0]
+
+
+@app.post("/login/async")
+async def login_async():
+    return (await password_hasher.verify_and_update("123456", password_hash))[0]
+
+
+@app.get("/ping")
+async def ping():
+    return "pong"
+
+
+async def burst(client: httpx.AsyncClient, path: str, logins: int) -> list[float]:
+    latencies = []
+    done = False
+
+    async def pinger():
+        # latency is taken from the scheduled send time, so a blocked loop counts
+        scheduled = time.perf_counter()
+        while not done:
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            await client.get("/ping")
+            latencies.append(time.perf_counter() - scheduled)
+            scheduled += 0.005
+
+    task = asyncio.create_task(pinger())
+    await asyncio.sleep(0.05)
+    await asyncio.gather(*(client.post(path) for _ in range(logins)))
+    done = True
+    await task
+    return latencies
+
+
+async def main(logins: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in ("/login/sync", "/login/async"):
+            start = time.perf_counter()
+            latencies = await burst(client, path, logins)
+            elapsed = time.perf_counter() - start
+            p99 = statistics.quantiles(latencies, n=100, method="inclusive")[98] if len(latencies) > 1 else latencies[0]
+            print(f"{path:<14} logins={logins} total={elapsed:.2f}s pings={len(latencies):<5} "
+                  f"ping p50={statistics.median(latencies) * 1000:.1f}ms p99={p99 * 1000:.1f}ms")
+    print(password_hasher.stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+from app.core.cache import tiered_cache
+
+
+def _racing_load(key: str, deleted: str):
+    async def scenario():
+        await tiered_cache.delete(key)
+        loading, release = asyncio.Event(), asyncio.Event()
+
+        async def loader():
+            loading.set()
+            await release.wait()
+            return {"key": key}
+
+        load = asyncio.ensure_future(tiered_cache.get_or_load(key, loader, ttl=60))
+        await loading.wait()
+        await tiered_cache.delete(deleted)
+        release.set()
+        await load
+        cached = await tiered_cache.get(key)
+        await tiered_cache.delete(key)
+        return cached
+
+    return scenario()
+
+
+def test_own_invalidation_echo_keeps_the_load(run):
+    async def scenario():
+        await tiered_cache.delete("test:echo")
+
+        async def loader():
+            # the listener receives the delete published above meanwhile
+            await asyncio.sleep(0.2)
+            return 1
+
+        await tiered_cache.get_or_load("test:echo", loader, ttl=60)
+        cached = tiered_cache.l1.get("test:echo")
+        await tiered_cache.delete("test:echo")
+        return cached
+
+    assert run(scenario()) is not None
+
+
+def test_delete_of_another_key_keeps_the_load(run):
+    assert run(_racing_load("test:loaded", "test:other")) == {"key": "test:loaded"}
+
+
+def test_delete_of_the_loading_key_drops_the_load(run):
+    assert run(_racing_load("test:loaded", "test:loaded")) is None
+    assert not tiered_cache._loads
+
+
+def test_l2_entry_carries_deadline_and_load_duration(run):
+    async def scenario():
+        await tiered_cache.delete("test:deadline")
+
+        async def loader():
+            await asyncio.sleep(0.01)
+            return [1, 2]
+
+        await tiered_cache.get_or_load("test:deadline", loader, ttl=60)
+        # read back as another worker would, from L2 only
+        tiered_cache.l1.delete("test:deadline")
+        entry = await tiered_cache._get_entry("test:deadline")
+        await tiered_cache.delete("test:deadline")
+        return entry, time.time()
+
+    (payload, deadline, delta), now = run(scenario())
+    assert tiered_cache.serializer.loads(payload) == [1, 2]
+    assert now + 55 < deadline <= now + 60
+    assert delta >= 0.01
+
+
+def test_l2_entry_without_header_is_a_miss(run):
+    async def scenario():
+        await tiered_cache.l2.set("test:legacy", tiered_cache.serializer.dumps([1]), dumps_fn=lambda v: v)
+        tiered_cache.l1.delete("test:legacy")
+        value = await tiered_cache.get_or_load("test:legacy", lambda: asyncio.sleep(0, [2]), ttl=60)
+        await tiered_cache.delete("test:legacy")
+        return value
+
+    assert run(scenario()) == [2]
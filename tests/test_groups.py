@@ -0,0 +1,27 @@
+from app.applications.groups.models import Group
+from app.applications.users.models import User
+from app.applications.users.schemas import BaseUserCreate
+from app.core.auth.deps import load_user
+from app.core.cache import tiered_cache
+
+
+def test_membership_changes_evict_cached_users(client, run):
+    group = run(Group.create(name="evicted"))
+    first = run(User.create(BaseUserCreate(email="member1@example.com", username="member1", password="123456")))
+    second = run(User.create(BaseUserCreate(email="member2@example.com", username="member2", password="123456")))
+
+    def cached_groups(user):
+        cached = run(tiered_cache.get_or_load(f"user:{user.id}", lambda: load_user(user.id), ttl=600))
+        return [g.name for g in cached.groups]
+
+    assert cached_groups(first) == cached_groups(second) == []
+
+    client.post(f"/groups/{group.id}/users", json={"user_ids": [first.id]})
+    assert cached_groups(first) == ["evicted"]
+
+    # replace evicts the removed members as well as the added ones
+    client.put(f"/groups/{group.id}/users", json={"user_ids": [second.id]})
+    assert (cached_groups(first), cached_groups(second)) == ([], ["evicted"])
+
+    client.request("DELETE", f"/groups/{group.id}/users", json={"user_ids": [second.id]})
+    assert cached_groups(second) == []
@@ -0,0 +1,118 @@
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from app.core import mail
+from app.core.config import settings
+from app.core.mail import SMTPPool, deliver
+
+
+class Stub:
+    """
+    Accepts everything except reject@ recipients (550 on RCPT),
+    later@ (451 on DATA) and spam@ (554 on DATA).
+    """
+
+    def __init__(self):
+        self.received = []
+        self.sessions = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("reject@"):
+            return "550 5.1.1 unknown recipient"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if any(to.startswith("later@") for to in envelope.rcpt_tos):
+            return "451 4.3.0 try again later"
+        if any(to.startswith("spam@") for to in envelope.rcpt_tos):
+            return "554 5.7.1 rejected"
+        self.received += envelope.rcpt_tos
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    handler = Stub()
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    monkeypatch.setattr(settings, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(settings, "SMTP_PORT", controller.port)
+    monkeypatch.setattr(settings, "SMTP_TLS", False)
+    monkeypatch.setattr(settings, "SMTP_SSL", False)
+    monkeypatch.setattr(settings, "SMTP_USER", None)
+    pool = SMTPPool(size=1, max_idle=60)
+    monkeypatch.setattr(mail, "smtp_pool", pool)
+    yield handler, pool
+    pool.close()
+    controller.stop()
+
+
+def _messages(*recipients: str) -> list:
+    return [{"to": to, "subject": "test", "html": "<p>hello</p>"} for to in recipients]
+
+
+def test_deliver_reuses_the_pooled_connection(smtp):
+    handler, pool = smtp
+    assert deliver(_messages("a@example.com", "b@example.com")) == (2, 0, [], None)
+    assert deliver(_messages("c@example.com")) == (1, 0, [], None)
+    assert handler.received == ["a@example.com", "b@example.com", "c@example.com"]
+    assert handler.sessions == 1
+    assert len(pool._idle) == 1
+
+
+def test_deliver_counts_permanent_rejections_as_failed(smtp):
+    handler, pool = smtp
+    sent, failed, pending, error = deliver(_messages("reject@example.com", "spam@example.com", "a@example.com"))
+    assert (sent, failed, pending, error) == (1, 2, [], None)
+    assert handler.received == ["a@example.com"]
+    assert len(pool._idle) == 1
+
+
+def test_deliver_returns_the_rest_as_pending_on_temporary_errors(smtp):
+    handler, pool = smtp
+    messages = _messages("a@example.com", "later@example.com", "b@example.com")
+    sent, failed, pending, error = deliver(messages)
+    assert (sent, failed) == (1, 0)
+    assert pending == messages[1:]
+    assert error.smtp_code == 451
+    # the connection is not trusted after an error
+    assert not pool._idle
+
+
+def test_deliver_returns_everything_as_pending_when_unreachable(smtp, monkeypatch):
+    monkeypatch.setattr(settings, "SMTP_PORT", _free_port())
+    messages = _messages("a@example.com")
+    sent, failed, pending, error = deliver(messages)
+    assert (sent, failed, pending) == (0, 0, messages)
+    assert isinstance(error, OSError)
+
+
+def test_acquire_checks_idle_connections(smtp):
+    _, pool = smtp
+    pool.max_idle = 0
+    conn = pool.acquire()
+    pool.release(conn)
+    # past max_idle, the connection is checked with NOOP and reused
+    assert pool.acquire() is conn
+
+    conn.close()
+    pool.release(conn)
+    # a dead connection is replaced
+    fresh = pool.acquire()
+    assert fresh is not conn
+    assert fresh.noop()[0] == 250
+    pool.release(fresh)
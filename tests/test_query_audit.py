@@ -0,0 +1,66 @@
+import pytest
+
+from app.applications.system.models import Menu
+from app.applications.users.models import User
+from app.applications.users.schemas import BaseUserCreate
+from app.core.query_audit import QueryAudit, RepeatedQueryError, fingerprint, record_requests
+
+
+def test_fingerprint_folds_literals():
+    assert fingerprint("SELECT \"id\" FROM \"menu\" WHERE \"parent_id\"=12 AND \"name\"='a''b' LIMIT 1") == \
+        fingerprint("SELECT \"id\" FROM \"menu\" WHERE \"parent_id\"=7 AND \"name\"='c' LIMIT 10") == \
+        "SELECT \"id\" FROM \"menu\" WHERE \"parent_id\"=? AND \"name\"=? LIMIT ?"
+
+
+def test_fingerprint_folds_lists_and_placeholders():
+    assert fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3) AND x=$1") == "SELECT * FROM t WHERE id IN (...) AND x=?"
+    assert fingerprint("INSERT INTO t (a,b) VALUES (1,'x'),(2,'y')") == "INSERT INTO t (a,b) VALUES (...)"
+    # digits inside identifiers are kept
+    assert fingerprint("SELECT t1.\"col2\" FROM t1") == "SELECT t1.\"col2\" FROM t1"
+
+
+@pytest.fixture(scope="module")
+def menu_root(run):
+    async def seed():
+        root = await Menu.create(name="audit-root")
+        for i in range(8):
+            await Menu.create(name=f"audit-child-{i}", parent=root)
+        return root
+
+    return run(seed())
+
+
+def test_per_row_queries_are_repeated(run, menu_root):
+    with QueryAudit(threshold=5) as audit:
+        run(menu_root.full_hierarchy__fetch_related())
+
+    (shape, count, _), = audit.repeated
+    assert count == 9
+    assert "\"parent_id\" IN (...)" in shape
+    with pytest.raises(RepeatedQueryError):
+        audit.assert_no_repeats()
+
+
+def test_threshold(run, menu_root):
+    with QueryAudit(threshold=9) as audit:
+        run(menu_root.full_hierarchy__fetch_related())
+    audit.assert_no_repeats()
+
+
+def test_menu_tree_is_one_query(run, menu_root, query_audit):
+    tree = run(Menu.full_hierarchy_menu())
+    assert query_audit.queries == 1
+    assert len(next(node for node in tree if node.name == "audit-root").children) == 8
+
+
+def test_requests_are_recorded(client, run, menu_root):
+    run(User.create(BaseUserCreate(email="audit@admin.com", username="audit", password="123456")))
+    token = client.post("/auth/login/access-token",
+                        data={"username": "audit", "password": "123456"}).json()["access_token"]
+
+    with record_requests() as requests:
+        assert client.get("/system/menus", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+    (method, route, audit), = requests
+    assert (method, route) == ("GET", "/system/menus")
+    audit.assert_no_repeats()
@@ -0,0 +1,27 @@
+from app.applications.system.models import Menu, Role
+from app.applications.system.schemas import MenuType
+
+
+def test_route_tree_names_and_roles(run):
+    async def scenario():
+        catalog = await Menu.create(name="routes-catalog", type=MenuType.CATALOG, path="/routes-test")
+        granted = await Menu.create(name="routes-granted", path="granted", component="test/granted/index",
+                                    route_name="RoutesGranted", parent=catalog)
+        await Menu.create(name="routes-ungranted", path="ungranted", parent=catalog)
+        role = await Role.create(name="routes-role", key="ROUTES")
+        await role.permissions.add(granted)
+        return await Menu.route_tree(), await Menu.route_tree(["ROUTES"])
+
+    everything, granted_only = run(scenario())
+    catalog, = [route for route in everything if route.path == "/routes-test"]
+    granted, ungranted = catalog.children
+    assert catalog.component == "Layout"
+    assert (granted.name, granted.meta.roles) == ("RoutesGranted", ["ROUTES"])
+    # no stored name is derived from the path, ungranted menus keep the default roles
+    assert (ungranted.name, ungranted.meta.roles) == (None, ["ADMIN"])
+    # a parent lets through the roles of all its children
+    assert catalog.meta.roles == ["ROUTES", "ADMIN"]
+
+    catalog, = [route for route in granted_only if route.path == "/routes-test"]
+    assert [child.path for child in catalog.children] == ["granted"]
+    assert catalog.meta.roles == ["ROUTES"]
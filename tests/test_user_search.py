@@ -0,0 +1,25 @@
+from app.applications.users.models import User, UserSearchTerm
+
+
+def test_rebuild_search_terms_indexes_bulk_inserted_users(run):
+    async def scenario():
+        # bulk_create bypasses User.save, so the users get no search terms
+        await User.bulk_create([User(email=f"backfill{i}@example.com", username=f"backfill-{i}", password_hash="x")
+                                for i in range(3)])
+        before = await User.search("backfill").count()
+        await User.rebuild_search_terms(batch_size=2)
+        return before, await User.search("backfill").values_list("username", flat=True), \
+            await User.search("backfill1 example").values_list("username", flat=True)
+
+    before, found, narrowed = run(scenario())
+    assert before == 0
+    assert sorted(found) == ["backfill-0", "backfill-1", "backfill-2"]
+    assert narrowed == ["backfill-1"]
+
+
+def test_rebuild_search_terms_is_idempotent(run):
+    async def count():
+        await User.rebuild_search_terms()
+        return await UserSearchTerm.all().count()
+
+    assert run(count()) == run(count())
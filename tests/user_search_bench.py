@@ -0,0 +1,66 @@
+#! /usr/bin/env python3
+"""
+Keyword search on the users table, icontains scan vs the UserSearchTerm prefix index.
+
+PYTHONPATH="./" python tests/user_search_bench.py 1000000
+"""
+import random
+import string
+import sys
+import time
+
+from tortoise import Tortoise, run_async
+from tortoise.expressions import Q
+
+from app.core.init_app import TORTOISE_ORM
+from app.applications.users.models import User, SEARCH_FIELDS
+
+ROUNDS = 20
+BATCH = 10000
+
+
+def word(length: int) -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=length))
+
+
+async def seed(total: int):
+    for start in range(0, total, BATCH):
+        users = [User(username=f"{word(6)}{i}", email=f"{word(8)}.{i}@{word(5)}.com",
+                      first_name=word(7).title(), last_name=word(9).title(), password_hash="x")
+                 for i in range(start, min(start + BATCH, total))]
+        await User.bulk_create(users)
+    await User.rebuild_search_terms(batch_size=BATCH)
+
+
+def icontains(keywords: str):
+    query = User.all()
+    for w in keywords.split():
+        query = query.filter(Q(*(Q(**{f"{f}__icontains": w}) for f in SEARCH_FIELDS), join_type="OR"))
+    return query
+
+
+async def measure(name, search, keywords: list[str]):
+    start = time.perf_counter()
+    found = 0
+    for kw in keywords:
+        found += len(await search(kw).order_by("id").limit(10))
+    elapsed = (time.perf_counter() - start) / len(keywords)
+    print(f"{name:<10} avg={elapsed * 1000:.2f}ms found={found}")
+
+
+async def main(total: int):
+    config = {**TORTOISE_ORM, "connections": {"default": "sqlite://:memory:"}}
+    await Tortoise.init(config=config)
+    await Tortoise.generate_schemas()
+    start = time.perf_counter()
+    await seed(total)
+    print(f"seeded {total} users in {time.perf_counter() - start:.1f}s")
+
+    samples = await User.filter(id__in=random.sample(range(1, total + 1), ROUNDS)).all()
+    keywords = [random.choice([u.username[:4], u.email[:5], u.last_name[:4]]) for u in samples]
+    await measure("icontains", icontains, keywords)
+    await measure("prefix", User.search, keywords)
+
+
+if __name__ == "__main__":
+    run_async(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))